@@ -0,0 +1,290 @@
+import argparse
+import datetime as dt
+import gzip
+import hashlib
+import json
+import random
+import threading
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from parser.constants import (
+    CAMPAIGN_CATEGORIES,
+    DATE_FORMAT,
+    PLATFORM_TYPES,
+    QUEUE_LIMIT_ERROR_CODE,
+    REPORT_FIELDS
+)
+
+DEVICES = ('DESKTOP', 'MOBILE', 'TABLET')
+"""Типы устройств в генерируемых отчетах."""
+
+SKIP_HEADERS = {
+    'skip_report_header': 'skipReportHeader',
+    'skip_column_header': 'skipColumnHeader',
+    'skip_report_summary': 'skipReportSummary'
+}
+"""Заголовки запроса, убирающие служебные строки из отчета."""
+
+
+@dataclass
+class MockConfig:
+    """Параметры имитации API отчетов."""
+
+    campaigns: int = 10
+    devices: int = 2
+    polls_before_ready: int = 2
+    retry_in: int = 1
+    error_rate_400: float = 0.0
+    error_rate_500: float = 0.0
+    max_report_days: int | None = None
+    queue_limit: int | None = None
+    seed: int = 0
+
+
+class MockDirectAPI:
+    """
+    Локальная имитация API отчетов Яндекс.Директ.
+
+    Отвечает 201/202 с retryIn, пока отчет «формируется»
+    (polls_before_ready опросов), затем 200 с TSV в формате Директа:
+    строка названия, заголовок, строки и итог «Total rows»; служебные
+    строки убираются заголовками skipReportHeader, skipColumnHeader
+    и skipReportSummary, колонки - по FieldNames запроса.
+    С заданными вероятностями отвечает 400 и 500, на отчеты длиннее
+    max_report_days - 502, при переполнении очереди логина -
+    400 с кодом QUEUE_LIMIT_ERROR_CODE. Данные детерминированы:
+    одинаковый запрос всегда дает одинаковый отчет.
+    Размер отчета: campaigns * devices строк на день.
+    """
+
+    def __init__(
+        self,
+        config: MockConfig | None = None,
+        host: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.config = config or MockConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._polls: dict[tuple[str, str], int] = {}
+        self.counters: dict[int, int] = {}
+        self._server = ThreadingHTTPServer(
+            (host, port), self._make_handler()
+        )
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """Адрес имитации для параметра api_url клиента."""
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/json/v5/reports'
+
+    def start(self) -> str:
+        """Запускает сервер в фоновом потоке и возвращает его адрес."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True
+        )
+        self._thread.start()
+        return self.url
+
+    def serve_forever(self) -> None:
+        """Запускает сервер в текущем потоке."""
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _get_campaign_names(self, login: str) -> list[str]:
+        """Защищенный метод. Названия кампаний с тегами классификатора."""
+        tags = list(CAMPAIGN_CATEGORIES) + ['other']
+        platforms = list(PLATFORM_TYPES) + ['rsya']
+        return [
+            f'{login}_{platforms[index % len(platforms)]}_'
+            f'{tags[index % len(tags)]}_{index}'
+            for index in range(self.config.campaigns)
+        ]
+
+    def build_report(
+        self,
+        login: str,
+        date_from: str,
+        date_to: str,
+        field_names: list[str] | None = None,
+        skip_report_header: bool = False,
+        skip_column_header: bool = False,
+        skip_report_summary: bool = False
+    ) -> bytes:
+        """
+        Генерирует TSV-отчет за период. Поля и служебные строки
+        (название, заголовок, итог) - как в запросе к API.
+        """
+        field_names = list(field_names or REPORT_FIELDS)
+        start = dt.datetime.strptime(date_from, DATE_FORMAT)
+        days = (dt.datetime.strptime(date_to, DATE_FORMAT) - start).days + 1
+        campaigns = self._get_campaign_names(login)
+        devices = DEVICES[:self.config.devices]
+        if 'Device' not in field_names:
+            devices = DEVICES[:1]
+        rows = []
+        for day in range(days):
+            date = (start + dt.timedelta(days=day)).strftime(DATE_FORMAT)
+            for index, name in enumerate(campaigns):
+                for device in devices:
+                    seed = int(hashlib.md5(
+                        f'{login}{date}{name}{device}'.encode()
+                    ).hexdigest()[:8], 16)
+                    clicks = seed % 97
+                    row = {
+                        'Date': date,
+                        'CampaignName': name,
+                        'CampaignId': 100000 + index,
+                        'Device': device,
+                        'Impressions': seed % 5000,
+                        'Clicks': clicks,
+                        'Cost': clicks * (seed % 40 + 1) * 1000000
+                    }
+                    rows.append('\t'.join(
+                        str(row[field]) for field in field_names
+                    ))
+        lines = []
+        if not skip_report_header:
+            lines.append('all_reports1')
+        if not skip_column_header:
+            lines.append('\t'.join(field_names))
+        lines.extend(rows)
+        if not skip_report_summary:
+            lines.append(f'Total rows: {len(rows)}')
+        if not lines:
+            return b''
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _make_handler(self):
+        """Защищенный метод. Создает класс обработчика запросов."""
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(
+                self,
+                code: int,
+                body: bytes = b'',
+                headers: dict | None = None
+            ) -> None:
+                if body and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers = {**(headers or {}), 'Content-Encoding': 'gzip'}
+                self.send_response(code)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, str(value))
+                self.send_header('RequestId', str(id(self)))
+                self.send_header('Units', '10/100000/200000')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with api._lock:
+                    api.counters[code] = api.counters.get(code, 0) + 1
+
+            def _send_error(self, code: int, error_code: int) -> None:
+                body = json.dumps({'error': {
+                    'error_code': error_code,
+                    'error_string': 'mock error',
+                    'request_id': str(id(self))
+                }}).encode('utf-8')
+                self._send(code, body, {'Content-Type': 'application/json'})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers['Content-Length']))
+                login = self.headers.get('Client-Login', '')
+                params = json.loads(raw)['params']
+                criteria = params['SelectionCriteria']
+                date_from = criteria['DateFrom']
+                date_to = criteria['DateTo']
+                key = (login, hashlib.md5(raw).hexdigest())
+                config = api.config
+
+                with api._lock:
+                    roll = api._random.random()
+                    polls = api._polls.get(key)
+                    queued = sum(1 for item in api._polls if item[0] == login)
+                if roll < config.error_rate_500:
+                    return self._send_error(500, 1000)
+                if roll < config.error_rate_500 + config.error_rate_400:
+                    return self._send_error(400, 8000)
+                if polls is None and config.queue_limit is not None and (
+                    queued >= config.queue_limit
+                ):
+                    return self._send_error(400, QUEUE_LIMIT_ERROR_CODE)
+                days = (
+                    dt.datetime.strptime(date_to, DATE_FORMAT)
+                    - dt.datetime.strptime(date_from, DATE_FORMAT)
+                ).days + 1
+                if config.max_report_days and days > config.max_report_days:
+                    return self._send_error(502, 0)
+
+                polls = (polls or 0) + 1
+                if polls <= config.polls_before_ready:
+                    with api._lock:
+                        api._polls[key] = polls
+                    code = 201 if polls == 1 else 202
+                    return self._send(code, headers={
+                        'retryIn': config.retry_in
+                    })
+                with api._lock:
+                    api._polls.pop(key, None)
+                self._send(
+                    200,
+                    api.build_report(
+                        login,
+                        date_from,
+                        date_to,
+                        params.get('FieldNames'),
+                        **{
+                            option: self.headers.get(header) == 'true'
+                            for option, header in SKIP_HEADERS.items()
+                        }
+                    ),
+                    {'Content-Type': 'text/tab-separated-values'}
+                )
+
+        return Handler
+
+
+def main():
+    """Запускает имитацию API из командной строки."""
+    arg_parser = argparse.ArgumentParser(
+        description='Локальная имитация API отчетов Яндекс.Директ'
+    )
+    arg_parser.add_argument('--port', type=int, default=8080)
+    arg_parser.add_argument('--campaigns', type=int, default=10)
+    arg_parser.add_argument('--polls', type=int, default=2)
+    arg_parser.add_argument('--retry-in', type=int, default=1)
+    arg_parser.add_argument('--error-rate-400', type=float, default=0.0)
+    arg_parser.add_argument('--error-rate-500', type=float, default=0.0)
+    arg_parser.add_argument('--max-report-days', type=int, default=None)
+    arg_parser.add_argument('--queue-limit', type=int, default=None)
+    args = arg_parser.parse_args()
+    api = MockDirectAPI(
+        MockConfig(
+            campaigns=args.campaigns,
+            polls_before_ready=args.polls,
+            retry_in=args.retry_in,
+            error_rate_400=args.error_rate_400,
+            error_rate_500=args.error_rate_500,
+            max_report_days=args.max_report_days,
+            queue_limit=args.queue_limit
+        ),
+        port=args.port
+    )
+    print(f'Имитация API запущена: {api.url}')
+    api.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import datetime as dt
+import json
+import multiprocessing
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.mock_direct_api import MockConfig, MockDirectAPI
+from parser.constants import (
+    CITILINK_CLIENT_LOGINS,
+    DATE_FORMAT,
+    EAPTEKA_CLIENT_LOGINS,
+    HISTORY_FOLDER
+)
+from parser.jobs import load_jobs
+from parser.rate_limiter import AdaptiveRateLimiter
+from parser.runner import PortfolioRunner
+from parser.storage import PartitionedStore
+from parser.utils import get_date_list, get_peak_memory_mb
+from parser.ya_direct import DirectSaveClient
+
+SCENARIOS = {
+    'eapteka': {'logins': EAPTEKA_CLIENT_LOGINS, 'history_years': 0},
+    'citilink': {'logins': CITILINK_CLIENT_LOGINS, 'history_years': 0},
+    'history': {'logins': EAPTEKA_CLIENT_LOGINS, 'history_years': 3},
+    'portfolios': {
+        'logins': EAPTEKA_CLIENT_LOGINS + CITILINK_CLIENT_LOGINS,
+        'history_years': 0,
+        'portfolios': ('eapteka', 'citilink')
+    },
+}
+"""
+Сценарии бенчмарка: логины и глубина заранее созданной истории.
+Сценарий с portfolios выгружает перечисленные портфели PORTFOLIOS
+одним запуском PortfolioRunner.
+"""
+
+DATA_FILENAME = 'benchmark_direct.csv'
+"""Имя выходного файла в сценариях бенчмарка."""
+
+
+def seed_history(folder: Path, logins: list[str], years: int, api) -> int:
+    """
+    Функция заранее создает историю за years лет до окна выгрузки
+    в хранилище сценария. Возвращает количество строк.
+    """
+    if years <= 0:
+        return 0
+    client = DirectSaveClient(
+        'benchmark', [], logins, folder_name=str(folder),
+        use_report_cache=False
+    )
+    store = PartitionedStore(
+        folder / HISTORY_FOLDER / Path(DATA_FILENAME).stem
+    )
+    first_date = dt.datetime.strptime(get_date_list()[0], DATE_FORMAT)
+    date_from = (first_date - dt.timedelta(days=365 * years))
+    date_to = first_date - dt.timedelta(days=1)
+    rows = 0
+    for login in logins:
+        df = client._parse_report(
+            api.build_report(
+                login,
+                date_from.strftime(DATE_FORMAT),
+                date_to.strftime(DATE_FORMAT),
+                client.report_fields,
+                skip_report_header=True,
+                skip_column_header=True,
+                skip_report_summary=True
+            ),
+            login
+        )
+        df = client._enrich_report_data(df)
+        store.append(df)
+        rows += len(df)
+    return rows
+
+
+def serve_mock(config: MockConfig, port_queue) -> None:
+    """Функция запускает имитацию API в отдельном процессе."""
+    api = MockDirectAPI(config)
+    port_queue.put(api.url)
+    api.serve_forever()
+
+
+def run_scenario(
+    name: str,
+    url: str,
+    config: MockConfig,
+    workers: int,
+    rate: float
+) -> dict:
+    """Функция прогоняет один сценарий и возвращает его метрики."""
+    scenario = SCENARIOS[name]
+    logins = scenario['logins']
+    with tempfile.TemporaryDirectory() as folder:
+        history_rows = seed_history(
+            Path(folder), logins, scenario['history_years'],
+            MockDirectAPI(config)
+        )
+        rate_limiter = AdaptiveRateLimiter(rate=rate, burst=int(rate) * 2)
+        if 'portfolios' in scenario:
+            jobs = load_jobs()
+            client = PortfolioRunner(
+                'benchmark',
+                [jobs[job] for job in scenario['portfolios']],
+                folder_name=folder,
+                max_workers=workers,
+                rate_limiter=rate_limiter,
+                use_report_cache=False,
+                api_url=url
+            )
+            filenames = [jobs[job].filename for job in scenario['portfolios']]
+            start_time = time.perf_counter()
+            client.run()
+        else:
+            client = DirectSaveClient(
+                'benchmark',
+                get_date_list(),
+                logins,
+                folder_name=folder,
+                max_workers=workers,
+                rate_limiter=rate_limiter,
+                use_report_cache=False,
+                api_url=url
+            )
+            filenames = [DATA_FILENAME]
+            start_time = time.perf_counter()
+            client.save_data('temp_benchmark.csv', DATA_FILENAME)
+        elapsed = time.perf_counter() - start_time
+        output_bytes = sum(
+            (Path(folder) / filename).stat().st_size
+            for filename in filenames
+        )
+
+    metrics = client.metrics.summary()
+    rows = int(metrics['counters'].get('rows', 0))
+    return {
+        'scenario': name,
+        'logins': len(logins),
+        'history_rows': history_rows,
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'logins_per_sec': round(len(logins) / elapsed, 2),
+        'rows_per_sec': round(rows / elapsed, 1),
+        'peak_rss_mb': get_peak_memory_mb(),
+        'output_bytes': output_bytes,
+        'http': client.transport.get_stats(),
+        'stages': {
+            stage: record['seconds']
+            for stage, record in metrics['stages'].items()
+        }
+    }
+
+
+def main():
+    """Запускает бенчмарк из командной строки."""
+    arg_parser = argparse.ArgumentParser(
+        description='Бенчмарк DirectSaveClient.save_data на имитации API'
+    )
+    arg_parser.add_argument(
+        '--scenario', choices=SCENARIOS, action='append',
+        help='сценарий (можно несколько), по умолчанию все'
+    )
+    arg_parser.add_argument('--workers', type=int, default=4)
+    arg_parser.add_argument('--rate', type=float, default=50)
+    arg_parser.add_argument('--campaigns', type=int, default=10)
+    arg_parser.add_argument('--polls', type=int, default=2)
+    arg_parser.add_argument('--retry-in', type=int, default=1)
+    arg_parser.add_argument('--error-rate-400', type=float, default=0.0)
+    arg_parser.add_argument('--error-rate-500', type=float, default=0.0)
+    arg_parser.add_argument('--max-report-days', type=int, default=None)
+    arg_parser.add_argument('--queue-limit', type=int, default=None)
+    arg_parser.add_argument('--json', help='файл для результатов (JSON lines)')
+    args = arg_parser.parse_args()
+
+    config = MockConfig(
+        campaigns=args.campaigns,
+        polls_before_ready=args.polls,
+        retry_in=args.retry_in,
+        error_rate_400=args.error_rate_400,
+        error_rate_500=args.error_rate_500,
+        max_report_days=args.max_report_days,
+        queue_limit=args.queue_limit
+    )
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        port_queue = context.Queue()
+        server = context.Process(
+            target=serve_mock, args=(config, port_queue), daemon=True
+        )
+        server.start()
+        url = port_queue.get()
+        try:
+            with context.Pool(1) as pool:
+                result = pool.apply(
+                    run_scenario,
+                    (name, url, config, args.workers, args.rate)
+                )
+        finally:
+            server.terminate()
+        results.append(result)
+        print(json.dumps(result, ensure_ascii=False))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            for result in results:
+                file.write(json.dumps(result, ensure_ascii=False) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+
+import pandas as pd
+
+from parser.constants import (
+    CAMPAIGN_CATEGORIES,
+    DEFAULT_RETURNES,
+    PLATFORM_TYPES
+)
+from parser.writer import atomic_open
+
+
+class TagMatcher:
+    """
+    Скомпилированный поиск тегов в названии кампании.
+
+    Все теги собраны в одно регулярное выражение с опережающей
+    проверкой, поэтому за один проход находятся все вхождения,
+    в том числе пересекающиеся. Из найденных выбирается тег,
+    который стоит раньше в словаре - как при переборе tag in name.
+    """
+
+    def __init__(self, tags: dict[str, str], default: str):
+        self.tags = tags
+        self.default = default
+        self._priority = {tag: index for index, tag in enumerate(tags)}
+        alternation = '|'.join(re.escape(tag) for tag in tags)
+        self._pattern = re.compile(f'(?=({alternation}))')
+
+    def match(self, name: str) -> str:
+        """Возвращает значение первого по порядку тега или default."""
+        found = {m.group(1) for m in self._pattern.finditer(name)}
+        if not found:
+            return self.default
+        return self.tags[min(found, key=self._priority.__getitem__)]
+
+
+class CampaignClassifier:
+    """
+    Классификатор кампаний по типу площадки и категории.
+
+    Классифицирует только уникальные названия кампаний и раскладывает
+    результат по строкам через Series.map. Результаты хранятся в
+    JSON-кэше, который переживает перезапуски и сбрасывается при
+    изменении PLATFORM_TYPES или CAMPAIGN_CATEGORIES.
+    """
+
+    def __init__(self, cache_path: Path | None = None):
+        self.platform_matcher = TagMatcher(
+            PLATFORM_TYPES, DEFAULT_RETURNES.get('platform', '')
+        )
+        self.category_matcher = TagMatcher(
+            CAMPAIGN_CATEGORIES, DEFAULT_RETURNES.get('campaign', '')
+        )
+        self.error_value = DEFAULT_RETURNES.get('error', '')
+        self.cache_path = cache_path
+        self.version = hashlib.sha1(
+            json.dumps(
+                [PLATFORM_TYPES, CAMPAIGN_CATEGORIES, DEFAULT_RETURNES],
+                ensure_ascii=False
+            ).encode('utf-8')
+        ).hexdigest()
+        self._cache: dict[str, list[str]] = self._load_cache()
+        self._cache_changed = False
+
+    def _load_cache(self) -> dict[str, list[str]]:
+        """Защищенный метод. Загружает кэш классификации с диска."""
+        if self.cache_path is None or not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') != self.version:
+                logging.info('Правила классификации изменились, кэш сброшен')
+                return {}
+            return data.get('names', {})
+        except (OSError, ValueError) as e:
+            logging.warning(f'Кэш классификации не прочитан: {e}')
+            return {}
+
+    def save_cache(self) -> None:
+        """
+        Сохраняет кэш классификации, если он пополнился.
+        Кэш на диске перечитывается и дополняется, поэтому процессы,
+        работающие параллельно, не теряют записи друг друга.
+        """
+        if self.cache_path is None or not self._cache_changed:
+            return
+        self._cache = {**self._load_cache(), **self._cache}
+        with atomic_open(self.cache_path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'version': self.version, 'names': self._cache},
+                file,
+                ensure_ascii=False
+            )
+        self._cache_changed = False
+
+    def classify(self, name) -> list[str]:
+        """Возвращает [тип площадки, категория] для названия кампании."""
+        if not isinstance(name, str):
+            return [self.error_value, self.error_value]
+        result = self._cache.get(name)
+        if result is None:
+            result = [
+                self.platform_matcher.match(name),
+                self.category_matcher.match(name)
+            ]
+            self._cache[name] = result
+            self._cache_changed = True
+        return result
+
+    def classify_frame(
+        self,
+        df: pd.DataFrame,
+        column: str = 'CampaignName'
+    ) -> tuple[pd.Series, pd.Series]:
+        """
+        Классифицирует колонку с названиями кампаний.
+        Возвращает серии типа площадки и категории, выровненные по df.
+        Для колонки category map отображает только категории и при
+        взаимно однозначном соответствии возвращает category, поэтому
+        результат переводится в object до заполнения пропусков.
+        """
+        if column not in df:
+            error = pd.Series(self.error_value, index=df.index)
+            return error, error.copy()
+        names = df[column]
+        results = {name: self.classify(name) for name in names.unique()}
+        platform = names.map(
+            {name: value[0] for name, value in results.items()}
+        )
+        category = names.map(
+            {name: value[1] for name, value in results.items()}
+        )
+        return (
+            platform.astype(object).fillna(self.error_value),
+            category.astype(object).fillna(self.error_value)
+        )
@@ -0,0 +1,53 @@
+import logging
+import pandas as pd
+
+from parser.schema import concat_frames
+from parser.utils import get_peak_memory_mb
+
+
+class BatchCollector:
+    """
+    Накопитель DataFrame, полученных по отдельным логинам.
+
+    Фреймы складываются в список и объединяются один раз
+    в materialize(), вместо pd.concat на каждой итерации,
+    который копирует все ранее собранные строки. Колонки category
+    при объединении остаются category.
+    """
+
+    def __init__(self):
+        self._frames: list[pd.DataFrame] = []
+        self.rows = 0
+        self.memory_bytes = 0
+        self.buffered_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def add(self, df: pd.DataFrame) -> None:
+        """Добавляет пакет строк одного логина."""
+        self._frames.append(df)
+        self.rows += len(df)
+        size = int(df.memory_usage(deep=True).sum())
+        self.memory_bytes += size
+        self.buffered_bytes += size
+
+    def materialize(self) -> pd.DataFrame:
+        """
+        Объединяет все пакеты в один DataFrame за одно копирование
+        и освобождает накопитель. rows и memory_bytes остаются
+        итогом за все время, buffered_bytes - объем еще
+        не объединенных пакетов.
+        """
+        combined_data = concat_frames(self._frames)
+        self._frames = []
+        self.buffered_bytes = 0
+        return combined_data
+
+    def log_stats(self) -> None:
+        """Логирует объем накопленных данных и пиковую память процесса."""
+        logging.info(
+            f'Собрано {self.rows} строк в {len(self)} пакетах, '
+            f'{round(self.memory_bytes / 1024 ** 2, 2)} МБ. '
+            f'Пиковая память процесса - {get_peak_memory_mb()} МБ.'
+        )
@@ -1,6 +1,49 @@
 YANDEX_DIRECT_URL = 'https://api.direct.yandex.com/json/v5/reports'
 """URL api для запроса отчета."""
 
+HTTP_CONNECT_TIMEOUT = 10
+"""Таймаут установки соединения с API, сек."""
+
+HTTP_READ_TIMEOUT = 300
+"""Таймаут чтения ответа API, сек."""
+
+HTTP_RETRIES = 3
+"""Количество повторов запроса при ошибках соединения и 5xx."""
+
+HTTP_BACKOFF_FACTOR = 1
+"""Множитель экспоненциальной паузы между повторами, сек."""
+
+HTTP_RETRY_STATUSES = (500, 503, 504)
+"""Коды ответа, при которых запрос повторяется на уровне транспорта."""
+
+RATE_LIMIT_PER_SECOND = 5
+"""Максимальный темп запросов к API, запросов в секунду."""
+
+RATE_LIMIT_MIN_RATE = 0.2
+"""Минимальный темп запросов при ограничениях API, запросов в секунду."""
+
+RATE_LIMIT_BURST = 10
+"""Емкость ведра токенов (запросов, допустимых подряд без паузы)."""
+
+RATE_LIMIT_PAUSE = 30
+"""Пауза всех запросов после сигнала ограничения от API, сек."""
+
+RATE_LIMIT_UNITS_RESERVE = 0.1
+"""Доля суточного лимита баллов, при остатке ниже которой темп снижается."""
+
+RATE_LIMIT_MAX_RETRIES = 10
+"""Сколько раз повторять отчет, отклоненный из-за ограничений API."""
+
+THROTTLE_ERROR_CODES = (52, 56, 152, 9000)
+"""
+Коды ошибок API, означающие ограничение: сервер перегружен (52),
+лимит запросов (56), недостаточно баллов (152),
+лимит отчетов в очереди (9000).
+"""
+
+QUEUE_LIMIT_ERROR_CODE = 9000
+"""Код ошибки API о переполнении очереди отчетов."""
+
 DATE_FORMAT = '%Y-%m-%d'
 """Формат дат по умолчанию ('%Y-%m-%d')."""
 
@@ -10,24 +53,246 @@ REPORT_NAME = 'all_reports1'
 DEFAULT_FOLDER = 'data'
 """Папка для сохранения .csv файлов по умолчанию."""
 
+HISTORY_FOLDER = 'history'
+"""Папка партиционированного хранилища истории (внутри папки данных)."""
+
+DATE_COLUMN = 'Date'
+"""Колонка с датой строки отчета."""
+
+ACCOUNT_COLUMN = 'акаунт'
+"""Колонка с логином аккаунта."""
+
+PLATFORM_COLUMN = 'поиск/сеть'
+"""Колонка с типом площадки (поиск или сеть)."""
+
+CATEGORY_COLUMN = 'тип'
+"""Колонка с категорией кампании."""
+
 DAYS_TO_GENERATE = 45
 """Количество дней для генерации списка дат по умолчанию."""
 
+VOLATILE_DAYS = 5
+"""Количество последних дней, статистика за которые еще меняется."""
+
+FULL_REFRESH_INTERVAL_DAYS = 7
+"""Раз во сколько дней окно DAYS_TO_GENERATE выгружается целиком."""
+
+WATERMARKS_FILE = '_watermarks.json'
+"""Файл водяных знаков инкрементальной выгрузки (в папке хранилища)."""
+
+REPORT_CACHE_FOLDER = '.report_cache'
+"""Папка кэша сырых ответов API (внутри папки данных)."""
+
+REPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+"""Максимальный размер кэша сырых ответов, байт."""
+
+REPORT_CACHE_LOW_WATER = 0.9
+"""
+Доля max_bytes, до которой очищается переполненный кэш ответов:
+запас, чтобы следующие записи не запускали очистку снова.
+"""
+
+REPORT_CACHE_VOLATILE_TTL = 3 * 60 * 60
+"""Срок жизни ответа, захватывающего меняющиеся дни, сек."""
+
+REPORT_CACHE_SETTLED_TTL = 30 * 24 * 60 * 60
+"""Срок жизни ответа только за устоявшиеся дни, сек."""
+
+STORE_BATCH_DATES = 31
+"""Сколько партиций дат хранилище читает за раз при чтении пачками."""
+
+CSV_INDEX_FILE = '_csv_index.json'
+"""
+Файл со смещениями месяцев в CSV, выгруженном из хранилища
+(в папке хранилища): по нему повторная выгрузка переписывает
+только месяцы с изменениями.
+"""
+
+CSV_COPY_CHUNK_BYTES = 1024 * 1024
+"""Размер куска при копировании неизменного начала CSV."""
+
+ROLLUP_FOLDER = '_rollups'
+"""Папка агрегатов (внутри папки хранилища)."""
+
+ROLLUP_KEYS = (ACCOUNT_COLUMN, PLATFORM_COLUMN, CATEGORY_COLUMN)
+"""Разрезы агрегатов помимо даты или месяца."""
+
+ROLLUP_METRICS = ('Impressions', 'Clicks', 'Cost')
+"""Суммируемые колонки агрегатов."""
+
+MONTH_COLUMN = 'Month'
+"""Колонка месяца (ГГГГ-ММ) в месячном агрегате."""
+
+ROLLUP_LEVELS = ('daily', 'monthly')
+"""Уровни агрегатов: по дням и по месяцам."""
+
+MERGE_STATE_FILE = '_merge.json'
+"""Файл отпечатков партиций шардов при сборке (в папке хранилища)."""
+
+FINGERPRINT_METADATA_KEY = 'direct_fingerprints'
+"""Ключ метаданных партиции с отпечатками строк аккаунтов."""
+
+COST_UNITS_METADATA_KEY = 'direct_cost_units'
+"""
+Ключ метаданных партиции с единицами расхода ('micros' -
+микроединицы без НДС). Партиции без него и без отпечатков
+записаны до REPORT_SCHEMA и хранят рубли с НДС.
+"""
+
+CHANGES_FILE = '_changes.jsonl'
+"""
+Журнал измененных пар (дата, логин) по запускам
+(в папке хранилища), для потребителей, обрабатывающих только изменения.
+"""
+
+JOURNAL_FILE = '_journal.json'
+"""Файл журнала запуска (в папке хранилища)."""
+
+FAILED_RETRY_PASSES = 1
+"""Сколько раз в конце запуска повторять неполученные отчеты."""
+
+LOGIN_STATS_FILE = 'login_stats.json'
+"""Файл накопленной статистики выгрузок по логинам (в папке данных)."""
+
+STATS_EMA_WEIGHT = 0.5
+"""Вес нового значения при сглаживании статистики логина."""
+
+REPORT_CHUNK_TARGET_BYTES = 50 * 1024 * 1024
+"""Целевой размер одного отчета, по которому режется период выгрузки."""
+
+DORMANT_EMPTY_RUNS = 3
+"""
+После скольких выгрузок подряд без строк логин считается спящим
+и опрашивается реже.
+"""
+
+DORMANT_POLL_INTERVAL_DAYS = 7
+"""Раз во сколько дней опрашивается спящий логин."""
+
+METRICS_FILE = 'metrics.jsonl'
+"""Файл истории метрик запусков в формате JSON lines (в папке данных)."""
+
+METRICS_PROM_FILE = 'direct_metrics.prom'
+"""Файл метрик последнего запуска для Prometheus (в папке данных)."""
+
+METRIC_PREFIX = 'direct'
+"""Префикс имен метрик в формате Prometheus."""
+
+PROFILE_ENV_VAR = 'DIRECT_PROFILE'
+"""
+Переменная окружения для профилирования запуска:
+cprofile - профиль процессора, tracemalloc - профиль памяти.
+"""
+
+PROFILE_TOP_LINES = 30
+"""Сколько строк профиля выводить в лог."""
+
+MAX_REPORTS_IN_QUEUE = 5
+"""Максимальное количество отчетов, одновременно находящихся в очереди API."""
+
+MAX_WORKERS = MAX_REPORTS_IN_QUEUE
+"""
+Количество потоков для выгрузки отчетов по умолчанию (--workers).
+Больше, чем отчетов в очереди API, не нужно: лишние потоки
+простаивают. Темп запросов ограничивает AdaptiveRateLimiter.
+"""
+
+PIPELINE_QUEUE_SIZE = 4
+"""Глубина очередей между этапами конвейера обработки (логинов)."""
+
+COLLECT_FLUSH_BYTES = 256 * 1024 * 1024
+"""
+Сколько байт строк приемник конвейера накапливает до записи
+в хранилище. Ограничивает память выгрузки вне зависимости от ее объема.
+"""
+
 EAPTEKA_ID = ''
 """ID Еаптека."""
 
 CITILINK_ID = ''
 """ID Ситилинк."""
 
-REPORT_FIELDS = [
-    "Date",
-    "CampaignName",
-    "CampaignId",
-    "Device",
-    "Impressions",
-    "Clicks",
-    "Cost"
-],
+REPORT_FIELDS = (
+    'Date',
+    'CampaignName',
+    'CampaignId',
+    'Device',
+    'Impressions',
+    'Clicks',
+    'Cost'
+)
+"""Поля отчета (FieldNames) профиля по умолчанию."""
+
+REPORT_REQUIRED_FIELDS = ('Date', 'CampaignName')
+"""
+Поля, без которых отчет нельзя обработать: дата нужна хранилищу,
+название кампании - классификатору.
+"""
+
+REPORT_PROFILES = {
+    'default': REPORT_FIELDS,
+    'campaigns': ('Date', 'CampaignName', 'Impressions', 'Clicks', 'Cost')
+}
+"""
+Именованные наборы полей отчета. 'campaigns' - без устройства
+и ID кампании: строк и байтов в отчете меньше в число устройств раз.
+"""
+
+REPORT_RESPONSE_HEADERS = {
+    'skipReportHeader': 'true',
+    'skipColumnHeader': 'true',
+    'skipReportSummary': 'true',
+    'returnMoneyInMicros': 'true'
+}
+"""
+Заголовки запроса отчета, с которыми API не присылает строку
+названия, строку заголовков колонок и итоговую строку, а деньги
+отдает целыми микроединицами.
+"""
+
+CLASSIFIER_CACHE_FILE = 'campaign_classes.json'
+"""Файл кэша классификации кампаний (в папке данных)."""
+
+REPORT_DTYPES = {
+    'Date': 'category',
+    'CampaignName': 'category',
+    'Device': 'category'
+}
+"""Типы текстовых колонок отчета при разборе TSV."""
+
+REPORT_SCHEMA = {
+    'Date': 'category',
+    'CampaignName': 'category',
+    'CampaignId': 'int64',
+    'Device': 'category',
+    'Impressions': 'int32',
+    'Clicks': 'int32',
+    'Cost': 'int64',
+    'акаунт': 'category',
+    'источник': 'category',
+    'поиск/сеть': 'category',
+    'тип': 'category'
+}
+"""
+Компактные типы колонок строк отчета в памяти и в хранилище.
+Повторяющиеся строки хранятся как category, расход - целыми
+микроединицами без НДС, как его отдает API.
+"""
+
+COST_COLUMN = 'Cost'
+"""Колонка с расходом."""
+
+MONEY_MICROS = 1000000
+"""Количество микроединиц в единице валюты."""
+
+VAT_RATE = 1.2
+"""Множитель НДС, с которым расход выгружается в CSV."""
+
+REPORT_FLOAT_OUTPUT_COLUMNS = ('CampaignId', 'Impressions', 'Clicks')
+"""
+Целочисленные колонки, которые в CSV всегда писались как float
+(итоговая строка отчета давала в них пропуск при разборе).
+"""
 
 CAMPAIGN_CATEGORIES = {
     'dsa': 'dsa',
@@ -151,3 +416,24 @@ EAPTEKA_CLIENT_LOGINS = [
     'imedia-eapteka'
 ]
 """Список логинов Еаптека."""
+
+PORTFOLIOS = {
+    'eapteka': {
+        'logins': EAPTEKA_CLIENT_LOGINS,
+        'filename': 'eapteka_direct.csv',
+        'days': DAYS_TO_GENERATE,
+        'profile': 'default'
+    },
+    'citilink': {
+        'logins': CITILINK_CLIENT_LOGINS,
+        'filename': 'citilink_direct.csv',
+        'days': DAYS_TO_GENERATE,
+        'profile': 'default'
+    }
+}
+"""
+Портфели (задания) запуска по умолчанию: логины, имя итогового
+файла данных, окно выгрузки в днях и профиль полей отчета
+(ключ REPORT_PROFILES). Файл заданий (--config) задается
+в том же виде в JSON.
+"""
@@ -1,7 +1,15 @@
+import cProfile
 import functools
+import io
 import logging
+import os
+import pstats
+import sys
+import threading
 import time
+import tracemalloc
 from datetime import datetime as dt
+from parser.constants import PROFILE_ENV_VAR, PROFILE_TOP_LINES
 from parser.logging_config import setup_logging
 
 
@@ -80,3 +88,112 @@ def time_of_script(func):
             logging.info('ENDLOGGING=1')
             raise
     return wrapper
+
+
+def time_of_stage(stage: str):
+    """
+    Декоратор для замера этапа выгрузки в метриках запуска.
+
+    Декорирует метод объекта с атрибутом metrics (RunMetrics) и
+    добавляет время выполнения метода в этап stage. Если метод
+    вызван с именованным аргументом login, время учитывается
+    и в разбивке по логину.
+
+    Args:
+        stage (str): Название этапа в метриках.
+
+    Returns:
+        callable: Декоратор метода.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.timer(stage, kwargs.get('login')):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _start_thread_profiler(profilers: list, lock: threading.Lock):
+    """
+    Функция возвращает хук threading.setprofile, который включает
+    отдельный cProfile в каждом новом потоке и кладет его в profilers.
+    """
+    def hook(frame, event, arg):
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+: профиль главного потока видит все потоки.
+            return
+        with lock:
+            profilers.append(profiler)
+    return hook
+
+
+def profile_run(func):
+    """
+    Декоратор для профилирования запуска по переменной окружения.
+
+    Если PROFILE_ENV_VAR равна cprofile, функция выполняется под
+    cProfile: профиль сохраняется в папку логов (.prof, открывается
+    pstats или snakeviz), верхние PROFILE_TOP_LINES строк по
+    накопленному времени пишутся в лог. Потоки, запущенные функцией
+    (планировщик, этапы конвейера), профилируются своими cProfile,
+    и их профили складываются с профилем главного потока. Если
+    равна tracemalloc, в лог пишутся пиковая память и строки кода,
+    выделившие больше всего памяти. Без переменной функция
+    выполняется как есть.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        mode = os.getenv(PROFILE_ENV_VAR, '').lower()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            thread_profilers = []
+            lock = threading.Lock()
+            threading.setprofile(
+                _start_thread_profiler(thread_profilers, lock)
+            )
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                threading.setprofile(None)
+                profile_path = os.path.abspath(os.path.join(
+                    os.path.dirname(__file__),
+                    '..',
+                    'logs',
+                    dt.now().strftime('profile_%Y-%m-%d_%H-%M-%S.prof')
+                ))
+                stream = io.StringIO()
+                stats = pstats.Stats(profiler, stream=stream)
+                with lock:
+                    for thread_profiler in thread_profilers:
+                        thread_profiler.create_stats()
+                        if thread_profiler.stats:
+                            stats.add(thread_profiler)
+                stats.dump_stats(profile_path)
+                stats.sort_stats('cumulative').print_stats(PROFILE_TOP_LINES)
+                logging.info(
+                    f'Профиль cProfile (потоков: {len(thread_profilers) + 1})'
+                    f' сохранен в {profile_path}\n{stream.getvalue()}'
+                )
+        if mode == 'tracemalloc':
+            tracemalloc.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                top = '\n'.join(
+                    str(stat) for stat in
+                    snapshot.statistics('lineno')[:PROFILE_TOP_LINES]
+                )
+                logging.info(
+                    'Профиль tracemalloc: пиковая память - '
+                    f'{round(peak / 1024 ** 2, 2)} МБ\n{top}'
+                )
+        return func(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,73 @@
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+from parser.constants import DAYS_TO_GENERATE, PORTFOLIOS, REPORT_PROFILES
+
+
+@dataclass(frozen=True)
+class PortfolioJob:
+    """Задание выгрузки одного портфеля логинов."""
+
+    name: str
+    logins: tuple[str, ...]
+    filename: str
+    days: int = DAYS_TO_GENERATE
+    profile: str = 'default'
+
+    @property
+    def report_fields(self) -> tuple[str, ...]:
+        """Поля отчета профиля задания."""
+        return REPORT_PROFILES[self.profile]
+
+    @property
+    def filename_temp(self) -> str:
+        """Имя файла для отладочного дампа сырых ответов."""
+        return f'temp_{self.filename}'
+
+
+def parse_jobs(config: dict[str, dict]) -> dict[str, PortfolioJob]:
+    """
+    Функция проверяет описание портфелей (в виде PORTFOLIOS)
+    и возвращает задания по именам. Ошибки описания - ValueError.
+    """
+    jobs = {}
+    filenames = set()
+    for name, item in config.items():
+        try:
+            job = PortfolioJob(
+                name=name,
+                logins=tuple(item['logins']),
+                filename=item['filename'],
+                days=int(item.get('days', DAYS_TO_GENERATE)),
+                profile=item.get('profile', 'default')
+            )
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Портфель {name} описан неверно: {e}')
+        if not job.logins:
+            raise ValueError(f'В портфеле {name} нет логинов')
+        if job.days < 1:
+            raise ValueError(f'Окно портфеля {name} должно быть от 1 дня')
+        if job.profile not in REPORT_PROFILES:
+            raise ValueError(
+                f'Неизвестный профиль отчета {job.profile} '
+                f'в портфеле {name}'
+            )
+        if job.filename in filenames:
+            raise ValueError(
+                f'Файл {job.filename} указан в нескольких портфелях'
+            )
+        filenames.add(job.filename)
+        jobs[name] = job
+    return jobs
+
+
+def load_jobs(path: Path | None = None) -> dict[str, PortfolioJob]:
+    """
+    Функция читает задания из JSON-файла того же вида, что PORTFOLIOS.
+    Без файла возвращает задания из PORTFOLIOS.
+    """
+    if path is None:
+        return parse_jobs(PORTFOLIOS)
+    with open(path, encoding='utf-8') as file:
+        return parse_jobs(json.load(file))
@@ -0,0 +1,116 @@
+import json
+import logging
+import threading
+import time
+from pathlib import Path
+
+from parser.writer import atomic_open
+
+
+class RunJournal:
+    """
+    Журнал запуска с состоянием каждого логина: pending, queued,
+    fetched, parsed, written, skipped (спящий логин не опрашивался)
+    или failed.
+
+    Состояние сохраняется на диск атомарно при каждом изменении,
+    поэтому после падения видно, какие логины уже записаны,
+    и повторный запуск в режиме resume обрабатывает только остальные.
+    Там же копятся даты, измененные в хранилище, но еще не выгруженные
+    в CSV и агрегаты: они переходят в следующий запуск, даже если
+    он начат без resume.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data = {'run_id': None, 'finished': True, 'logins': {}}
+
+    def _load(self) -> dict | None:
+        """Защищенный метод. Загружает журнал предыдущего запуска."""
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f'Журнал запуска не прочитан: {e}')
+            return None
+
+    def _save(self) -> None:
+        """Защищенный метод. Атомарно сохраняет журнал."""
+        with atomic_open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(self._data, file, ensure_ascii=False, indent=4)
+
+    def start(self, logins: list[str], resume: bool = False) -> list[str]:
+        """
+        Начинает запуск и возвращает логины, которые нужно обработать.
+        При resume=True и незавершенном предыдущем запуске возвращает
+        только логины, еще не дошедшие до состояния 'written'.
+        """
+        previous = self._load()
+        dates = previous.get('dates', []) if previous else []
+        with self._lock:
+            if (
+                resume and previous
+                and not previous.get('finished', True)
+            ):
+                self._data = previous
+                for login in logins:
+                    self._data['logins'].setdefault(login, 'pending')
+                unfinished = [
+                    login for login in logins
+                    if self._data['logins'][login] != 'written'
+                ]
+                logging.info(
+                    f'Продолжение запуска {self._data["run_id"]}: '
+                    f'осталось {len(unfinished)} из {len(logins)} логинов'
+                )
+            else:
+                self._data = {
+                    'run_id': str(int(time.time())),
+                    'finished': False,
+                    'logins': {login: 'pending' for login in logins},
+                    'dates': dates
+                }
+                unfinished = list(logins)
+            self._save()
+        return unfinished
+
+    def set_states(self, logins: list[str], state: str) -> None:
+        """Записывает одно состояние для нескольких логинов."""
+        with self._lock:
+            for login in logins:
+                self._data['logins'][login] = state
+            self._save()
+
+    def get_logins(self, state: str) -> list[str]:
+        """Возвращает логины в указанном состоянии."""
+        return [
+            login for login, current in self._data['logins'].items()
+            if current == state
+        ]
+
+    def add_dates(self, dates: list[str]) -> None:
+        """Добавляет даты, еще не выгруженные в CSV и агрегаты."""
+        with self._lock:
+            self._data['dates'] = sorted(
+                set(self._data.get('dates', [])) | set(dates)
+            )
+            self._save()
+
+    def get_dates(self) -> list[str]:
+        """Возвращает даты, еще не выгруженные в CSV и агрегаты."""
+        return list(self._data.get('dates', []))
+
+    def clear_dates(self) -> None:
+        """Отмечает все накопленные даты выгруженными."""
+        with self._lock:
+            self._data['dates'] = []
+            self._save()
+
+    def finish(self) -> None:
+        """Отмечает запуск завершенным."""
+        with self._lock:
+            self._data['finished'] = True
+            self._save()
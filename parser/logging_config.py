@@ -17,7 +17,11 @@ def setup_logging():
 
     Логи сохраняются в папку 'logs' с именем файла в формате ГГГГ-ММ-ДД.log.
     Автоматически создает папку логов, если она не существует.
+    Если у корневого логгера уже есть обработчики (логирование
+    настроено раньше, например тестами), ничего не делает.
     """
+    if logging.getLogger().handlers:
+        return
     log_dir = os.path.abspath(
         os.path.join(os.path.dirname(__file__), '..', 'logs')
     )
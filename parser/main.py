@@ -1,25 +1,124 @@
+import argparse
+import logging
 import os
+from pathlib import Path
 
 from dotenv import load_dotenv
 
-from parser.constants import CITILINK_CLIENT_LOGINS, EAPTEKA_CLIENT_LOGINS
-from parser.decorators import time_of_script
+from parser.constants import MAX_WORKERS
+from parser.decorators import profile_run, time_of_script
+from parser.jobs import load_jobs
+from parser.runner import PortfolioRunner
 from parser.ya_direct import DirectSaveClient
-from parser.utils import get_date_list
+from parser.utils import get_date_list, parse_shard
 
 load_dotenv()
 
 
+def shard_arg(value: str) -> tuple[int, int]:
+    """Функция проверяет аргумент --shard для argparse."""
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def positive_int_arg(value: str) -> int:
+    """Функция проверяет аргументы --merge и --workers для argparse."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f'ожидается целое число, получено: {value}'
+        )
+    if number < 1:
+        raise argparse.ArgumentTypeError(
+            f'ожидается число не меньше 1, получено: {value}'
+        )
+    return number
+
+
+def parse_args() -> argparse.Namespace:
+    """Функция разбирает аргументы командной строки."""
+    arg_parser = argparse.ArgumentParser(
+        description='Выгрузка статистики Яндекс.Директ'
+    )
+    arg_parser.add_argument(
+        '--config',
+        type=Path,
+        help='JSON-файл портфелей (по умолчанию PORTFOLIOS из constants)'
+    )
+    arg_parser.add_argument(
+        '--portfolio',
+        action='append',
+        help='портфель для выгрузки (можно несколько), по умолчанию все'
+    )
+    arg_parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='продолжить прерванный запуск по незаписанным логинам'
+    )
+    arg_parser.add_argument(
+        '--workers',
+        type=positive_int_arg,
+        default=MAX_WORKERS,
+        help=f'потоков выгрузки отчетов (по умолчанию {MAX_WORKERS})'
+    )
+    arg_parser.add_argument(
+        '--full',
+        action='store_true',
+        help='выгрузить полный период по всем логинам, '
+             'не глядя на водяные знаки'
+    )
+    arg_parser.add_argument(
+        '--debug-dump',
+        action='store_true',
+        help='сохранять сырые ответы API в temp_<файл портфеля>'
+    )
+    mode = arg_parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        '--shard',
+        type=shard_arg,
+        metavar='i/N',
+        help='выгрузить только шард i из N (логины делятся по хэшу)'
+    )
+    mode.add_argument(
+        '--merge',
+        type=positive_int_arg,
+        metavar='N',
+        help='собрать итоговые данные из выгрузок N шардов'
+    )
+    return arg_parser.parse_args()
+
+
 @time_of_script
+@profile_run
 def main():
     """Основная логика скрипта."""
+    args = parse_args()
     token = str(os.getenv('YANDEX_DIRECT_TOKEN'))
-    date_list = get_date_list()
-    saver = DirectSaveClient(token, date_list, EAPTEKA_CLIENT_LOGINS)
-    saver.save_data(
-        filename_temp='temp_eapteka_direct.csv',
-        filename_data='eapteka_direct.csv'
-    )
+    jobs = load_jobs(args.config)
+    names = args.portfolio or list(jobs)
+    unknown = [name for name in names if name not in jobs]
+    if unknown:
+        logging.error(f'Неизвестные портфели: {", ".join(unknown)}')
+        return
+    selected = [jobs[name] for name in names]
+    if args.merge is not None:
+        for job in selected:
+            DirectSaveClient(
+                token, get_date_list(job.days), list(job.logins)
+            ).merge_shards(job.filename, args.merge)
+        return
+    PortfolioRunner(
+        token,
+        selected,
+        max_workers=args.workers,
+        incremental=True,
+        force_full=args.full,
+        debug_dump=args.debug_dump,
+        shard=args.shard
+    ).run(resume=args.resume)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from parser.constants import METRIC_PREFIX
+from parser.utils import get_peak_memory_mb
+from parser.writer import atomic_open
+
+
+def _escape_label(value: str) -> str:
+    """Функция экранирует значение метки Prometheus."""
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class RunMetrics:
+    """
+    Метрики одного запуска выгрузки.
+
+    Копит время и количество вызовов этапов (ожидание отчета в очереди,
+    скачивание, разбор, классификация, слияние, запись) и счетчики
+    (байты, строки, запросы) - в целом по запуску и по логинам.
+    Потокобезопасен: этапы скачивания пишутся из потоков планировщика.
+    Выгружается в JSON lines (история запусков) и в текстовый файл
+    Prometheus для textfile-коллектора node_exporter.
+    """
+
+    def __init__(self, run_id: str | None = None):
+        self.run_id = run_id or str(int(time.time()))
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stages: dict[str | None, dict[str, list[float]]] = {}
+        self._counters: dict[str | None, dict[str, float]] = {}
+
+    def add_time(
+        self,
+        stage: str,
+        seconds: float,
+        login: str | None = None
+    ) -> None:
+        """
+        Добавляет время этапа. С логином время учитывается
+        и в итоге логина, и в итоге запуска.
+        """
+        with self._lock:
+            for scope in {None, login}:
+                record = self._stages.setdefault(scope, {}).setdefault(
+                    stage, [0.0, 0]
+                )
+                record[0] += seconds
+                record[1] += 1
+
+    def incr(
+        self,
+        name: str,
+        value: float = 1,
+        login: str | None = None
+    ) -> None:
+        """Увеличивает счетчик запуска и, если задан, логина."""
+        with self._lock:
+            for scope in {None, login}:
+                counters = self._counters.setdefault(scope, {})
+                counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage: str, login: str | None = None) -> Iterator[None]:
+        """Контекстный менеджер, замеряющий время блока как этап."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start_time, login)
+
+    def _get_scope(self, login: str | None) -> dict:
+        """Защищенный метод. Возвращает этапы и счетчики одной области."""
+        return {
+            'stages': {
+                stage: {'seconds': round(seconds, 3), 'count': count}
+                for stage, (seconds, count)
+                in self._stages.get(login, {}).items()
+            },
+            'counters': dict(self._counters.get(login, {}))
+        }
+
+    def get_logins(self) -> list[str]:
+        """Возвращает логины, по которым есть метрики."""
+        with self._lock:
+            scopes = set(self._stages) | set(self._counters)
+        return sorted(scope for scope in scopes if scope is not None)
+
+    def summary(self) -> dict:
+        """Возвращает метрики запуска с разбивкой по логинам."""
+        logins = self.get_logins()
+        with self._lock:
+            return {
+                'run_id': self.run_id,
+                'started_at': round(self.started_at, 3),
+                'seconds': round(time.time() - self.started_at, 3),
+                'peak_rss_mb': get_peak_memory_mb(),
+                **self._get_scope(None),
+                'logins': {login: self._get_scope(login) for login in logins}
+            }
+
+    def write_jsonl(self, path: Path) -> None:
+        """
+        Дописывает метрики запуска в файл JSON lines: одна строка
+        на запуск (login = null) и по строке на каждый логин.
+        """
+        summary = self.summary()
+        logins = summary.pop('logins')
+        records = [{**summary, 'login': None}] + [
+            {'run_id': self.run_id, 'login': login, **scope}
+            for login, scope in logins.items()
+        ]
+        with open(path, 'a', encoding='utf-8') as file:
+            for record in records:
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def write_prometheus(self, path: Path) -> None:
+        """
+        Записывает метрики в текстовый формат Prometheus. Файл
+        заменяется атомарно, чтобы коллектор не прочитал его частично.
+        """
+        summary = self.summary()
+        seconds, calls, counters = [], [], []
+        scopes = [(None, summary)] + list(summary['logins'].items())
+        for login, scope in scopes:
+            login_label = ''
+            if login is not None:
+                login_label = f',login="{_escape_label(login)}"'
+            for stage, record in scope['stages'].items():
+                labels = f'stage="{_escape_label(stage)}"{login_label}'
+                seconds.append(
+                    f'{METRIC_PREFIX}_stage_seconds{{{labels}}} '
+                    f'{record["seconds"]}'
+                )
+                calls.append(
+                    f'{METRIC_PREFIX}_stage_calls{{{labels}}} '
+                    f'{record["count"]}'
+                )
+            for name, value in scope['counters'].items():
+                labels = f'name="{_escape_label(name)}"{login_label}'
+                counters.append(
+                    f'{METRIC_PREFIX}_counter{{{labels}}} {value}'
+                )
+        lines = [
+            f'# HELP {METRIC_PREFIX}_stage_seconds '
+            'Время этапа выгрузки за запуск, сек.',
+            f'# TYPE {METRIC_PREFIX}_stage_seconds gauge',
+            *seconds,
+            f'# HELP {METRIC_PREFIX}_stage_calls '
+            'Количество выполнений этапа за запуск.',
+            f'# TYPE {METRIC_PREFIX}_stage_calls gauge',
+            *calls,
+            f'# HELP {METRIC_PREFIX}_counter Счетчики запуска.',
+            f'# TYPE {METRIC_PREFIX}_counter gauge',
+            *counters
+        ]
+        lines.append(f'{METRIC_PREFIX}_run_seconds {summary["seconds"]}')
+        if summary['peak_rss_mb'] is not None:
+            lines.append(
+                f'{METRIC_PREFIX}_peak_rss_mb {summary["peak_rss_mb"]}'
+            )
+        lines.append(
+            f'{METRIC_PREFIX}_last_run_timestamp_seconds '
+            f'{summary["started_at"]}'
+        )
+        with atomic_open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    def log_stats(self) -> None:
+        """Логирует время этапов и счетчики запуска."""
+        summary = self.summary()
+        stages = ', '.join(
+            f'{stage} - {record["seconds"]} сек. ({record["count"]})'
+            for stage, record in summary['stages'].items()
+        )
+        counters = ', '.join(
+            f'{name} - {value}'
+            for name, value in summary['counters'].items()
+        )
+        logging.info(f'Этапы запуска {self.run_id}: {stages}')
+        logging.info(f'Счетчики запуска {self.run_id}: {counters}')
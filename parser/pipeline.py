@@ -0,0 +1,124 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from parser.constants import PIPELINE_QUEUE_SIZE
+from parser.metrics import RunMetrics
+
+_STOP = object()
+"""Маркер завершения потока этапа."""
+
+
+class Pipeline:
+    """
+    Конвейер этапов обработки, соединенных ограниченными очередями.
+
+    Каждый этап работает в своем потоке: берет элемент из входной
+    очереди, обрабатывает его и кладет результат в очередь следующего
+    этапа. Этап, вернувший None, отбрасывает элемент; последний этап
+    (приемник) ничего не передает дальше. Пока один этап ждет сеть
+    или диск, другие обрабатывают следующие элементы. Очереди вмещают
+    не больше queue_size элементов: put() блокируется, если этапы
+    не успевают, поэтому в очередях и в обработке одновременно
+    не больше (число этапов) * (queue_size + 1) элементов. Так
+    ограничиваются только элементы, ждущие обработки: то, что
+    накапливает приемник, от глубины очередей не зависит.
+    """
+
+    def __init__(
+        self,
+        stages: list[tuple[str, Callable[[Any], Any]]],
+        queue_size: int = PIPELINE_QUEUE_SIZE,
+        metrics: RunMetrics | None = None
+    ):
+        self.stages = stages
+        self.metrics = metrics
+        self._queues = [
+            queue.Queue(maxsize=max(1, queue_size)) for _ in stages
+        ]
+        self._threads = [
+            threading.Thread(
+                target=self._run_stage,
+                args=(index,),
+                name=f'pipeline-{name}',
+                daemon=True
+            )
+            for index, (name, _) in enumerate(stages)
+        ]
+        self._started = False
+
+    def _put(self, index: int, item: Any) -> None:
+        """
+        Защищенный метод. Кладет элемент во входную очередь этапа,
+        учитывая время ожидания свободного места.
+        """
+        start_time = time.perf_counter()
+        self._queues[index].put(item)
+        if self.metrics is not None and item is not _STOP:
+            self.metrics.add_time(
+                f'{self.stages[index][0]}_backpressure',
+                time.perf_counter() - start_time
+            )
+
+    def _run_stage(self, index: int) -> None:
+        """Защищенный метод. Цикл потока одного этапа."""
+        name, func = self.stages[index]
+        is_last = index == len(self.stages) - 1
+        while True:
+            item = self._queues[index].get()
+            if item is _STOP:
+                if not is_last:
+                    self._put(index + 1, _STOP)
+                self._queues[index].task_done()
+                return
+            try:
+                result = func(item)
+            except Exception as e:
+                logging.error(f'Ошибка на этапе {name}: {e}')
+                result = None
+            if result is not None and not is_last:
+                self._put(index + 1, result)
+            self._queues[index].task_done()
+
+    def start(self) -> 'Pipeline':
+        """Запускает потоки этапов."""
+        for thread in self._threads:
+            thread.start()
+        self._started = True
+        return self
+
+    def put(self, item: Any) -> None:
+        """
+        Передает элемент первому этапу.
+        Блокируется, пока в очереди нет места.
+        """
+        if not self._started:
+            self.start()
+        self._put(0, item)
+
+    def join(self) -> None:
+        """
+        Дожидается обработки всех переданных элементов,
+        не останавливая потоки этапов.
+        """
+        if not self._started:
+            return
+        for stage_queue in self._queues:
+            stage_queue.join()
+
+    def close(self) -> None:
+        """Дожидается обработки всех переданных элементов."""
+        if not self._started:
+            return
+        self._put(0, _STOP)
+        for thread in self._threads:
+            thread.join()
+        self._started = False
+
+    def __enter__(self) -> 'Pipeline':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
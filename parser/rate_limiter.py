@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+
+import requests
+
+from parser.constants import (
+    MAX_REPORTS_IN_QUEUE,
+    QUEUE_LIMIT_ERROR_CODE,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MIN_RATE,
+    RATE_LIMIT_PAUSE,
+    RATE_LIMIT_PER_SECOND,
+    RATE_LIMIT_UNITS_RESERVE,
+    THROTTLE_ERROR_CODES
+)
+
+
+class AdaptiveRateLimiter:
+    """
+    Общий для всех потоков ограничитель запросов к API.
+
+    Темп запросов задается ведром токенов. Допустимое число
+    одновременно формируемых отчетов (concurrency) меняется по AIMD:
+    растет на единицу после серии успешных ответов и уменьшается вдвое
+    при ошибке переполнения очереди отчетов. Темп так же растет после
+    успешных ответов и снижается вдвое при остальных ошибках из
+    THROTTLE_ERROR_CODES, ответе HTTP 429 и когда остаток баллов
+    в заголовке Units меньше RATE_LIMIT_UNITS_RESERVE от суточного
+    лимита.
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        max_concurrency: int = MAX_REPORTS_IN_QUEUE
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_concurrency = max(1, max_concurrency)
+        self.concurrency = self.max_concurrency
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._successes = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Блокирует поток, пока не появится токен на запрос."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._tokens) / self.rate
+                )
+            time.sleep(wait)
+
+    def _throttle(self, pause: float, queue_limit: bool = False) -> None:
+        """
+        Защищенный метод. При переполнении очереди отчетов снижает
+        параллельность, при остальных ограничениях - темп запросов.
+        """
+        if queue_limit:
+            self.concurrency = max(1, self.concurrency // 2)
+        else:
+            self.rate = max(RATE_LIMIT_MIN_RATE, self.rate / 2)
+        self._successes = 0
+        self._paused_until = max(
+            self._paused_until, time.monotonic() + pause
+        )
+        logging.warning(
+            'Ограничение API: темп снижен до '
+            f'{round(self.rate, 2)} запр./сек, '
+            f'отчетов в очереди - до {self.concurrency}'
+        )
+
+    def _units_exhausted(self, response: requests.Response) -> bool:
+        """Защищенный метод. Проверяет остаток баллов в заголовке Units."""
+        try:
+            _, rest, limit = response.headers['Units'].split('/')
+            return int(rest) < int(limit) * RATE_LIMIT_UNITS_RESERVE
+        except (KeyError, ValueError):
+            return False
+
+    def _get_error_code(self, response: requests.Response) -> int | None:
+        """Защищенный метод. Возвращает код ошибки API из ответа 400."""
+        if response.status_code != requests.codes.bad_request:
+            return None
+        try:
+            return int(response.json()['error']['error_code'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def is_throttled(self, response: requests.Response) -> bool:
+        """Проверяет, является ли ответ сигналом ограничения API."""
+        return (
+            response.status_code == requests.codes.too_many_requests
+            or self._get_error_code(response) in THROTTLE_ERROR_CODES
+        )
+
+    def on_response(self, response: requests.Response) -> None:
+        """Подстраивает темп и параллельность по ответу API."""
+        with self._lock:
+            error_code = self._get_error_code(response)
+            if error_code in THROTTLE_ERROR_CODES:
+                self._throttle(
+                    RATE_LIMIT_PAUSE,
+                    queue_limit=error_code == QUEUE_LIMIT_ERROR_CODE
+                )
+                return
+            if response.status_code == requests.codes.too_many_requests:
+                self._throttle(RATE_LIMIT_PAUSE)
+                return
+            if self._units_exhausted(response):
+                self._throttle(0)
+                return
+            if response.status_code >= 400:
+                return
+            self._successes += 1
+            if self._successes >= self.concurrency:
+                self._successes = 0
+                self.rate = min(self.max_rate, self.rate * 1.5)
+                self.concurrency = min(
+                    self.max_concurrency, self.concurrency + 1
+                )
@@ -0,0 +1,165 @@
+import datetime as dt
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from parser.constants import (
+    DATE_FORMAT,
+    REPORT_CACHE_LOW_WATER,
+    REPORT_CACHE_MAX_BYTES,
+    REPORT_CACHE_SETTLED_TTL,
+    REPORT_CACHE_VOLATILE_TTL,
+    VOLATILE_DAYS
+)
+
+
+class ReportCache:
+    """
+    Дисковый кэш сырых ответов API отчетов.
+
+    Ключ - SHA-256 от логина, JSON-тела запроса (период, поля,
+    параметры отчета) и заголовков формата ответа, поэтому одинаковые
+    запросы попадают в одну запись. Ответы хранятся сжатыми gzip.
+    Записи с датами, статистика за которые еще меняется, живут
+    volatile_ttl секунд, остальные - settled_ttl. При превышении
+    max_bytes удаляются записи, к которым дольше всего не обращались,
+    пока кэш не уменьшится до REPORT_CACHE_LOW_WATER от max_bytes.
+
+    Размер кэша считается обходом папки один раз, при первой записи,
+    и дальше ведется в памяти, поэтому запись не обходит весь кэш.
+    Записи других процессов в этот счетчик не попадают: он уточняется
+    обходом при каждой очистке.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_bytes: int = REPORT_CACHE_MAX_BYTES,
+        volatile_ttl: int = REPORT_CACHE_VOLATILE_TTL,
+        settled_ttl: int = REPORT_CACHE_SETTLED_TTL,
+        volatile_days: int = VOLATILE_DAYS
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.volatile_ttl = volatile_ttl
+        self.settled_ttl = settled_ttl
+        self.volatile_days = volatile_days
+        self.hits = 0
+        self.misses = 0
+        self._size: int | None = None
+        self._lock = threading.Lock()
+
+    def make_key(
+        self,
+        login: str,
+        body: str,
+        headers: dict[str, str] | None = None
+    ) -> str:
+        """
+        Возвращает ключ записи для логина, тела запроса и заголовков,
+        меняющих формат ответа (без названия, итога и т.п.).
+        """
+        options = json.dumps(headers or {}, sort_keys=True)
+        return hashlib.sha256(
+            f'{login}\n{body}\n{options}'.encode('utf-8')
+        ).hexdigest()
+
+    def _get_path(self, key: str) -> Path:
+        """Защищенный метод. Возвращает путь к файлу записи."""
+        return self.root / key[:2] / f'{key}.tsv.gz'
+
+    def _get_ttl(self, date_to: str) -> int:
+        """Защищенный метод. Возвращает срок жизни записи по периоду."""
+        settled = dt.date.today() - dt.timedelta(days=self.volatile_days)
+        if dt.datetime.strptime(date_to, DATE_FORMAT).date() > settled:
+            return self.volatile_ttl
+        return self.settled_ttl
+
+    def get(self, key: str, date_to: str) -> bytes | None:
+        """Возвращает сохраненный ответ или None, если его нет/устарел."""
+        path = self._get_path(key)
+        try:
+            stat = path.stat()
+            if time.time() - stat.st_mtime > self._get_ttl(date_to):
+                self._remove(path, stat.st_size)
+                raise FileNotFoundError
+            with gzip.open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path, (time.time(), stat.st_mtime))
+        except (OSError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def _remove(self, path: Path, size: int) -> None:
+        """Защищенный метод. Удаляет файл записи и вычитает его размер."""
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if self._size is not None:
+                self._size -= size
+
+    def put(self, key: str, data: bytes) -> None:
+        """Сохраняет ответ и при необходимости освобождает место."""
+        path = self._get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(
+            f'.{os.getpid()}.{threading.get_ident()}.tmp'
+        )
+        with gzip.open(temp_path, 'wb', compresslevel=6) as file:
+            file.write(data)
+        size = temp_path.stat().st_size
+        with self._lock:
+            try:
+                size -= path.stat().st_size
+            except OSError:
+                pass
+            os.replace(temp_path, path)
+            if self._size is None:
+                self._size = sum(entry[1] for entry in self._scan())
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """
+        Защищенный метод. Обходит кэш и возвращает записи
+        в виде (время обращения, размер, путь).
+        """
+        entries = []
+        for path in self.root.glob('*/*.tsv.gz'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """
+        Защищенный метод. Удаляет давно не использованные записи,
+        пока кэш больше REPORT_CACHE_LOW_WATER от max_bytes.
+        Вызывается под self._lock.
+        """
+        entries = self._scan()
+        total = sum(entry[1] for entry in entries)
+        target = self.max_bytes * REPORT_CACHE_LOW_WATER
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        self._size = total
+        logging.info(f'Кэш отчетов очищен до {total} байт')
@@ -0,0 +1,147 @@
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+from parser.constants import (
+    DATE_COLUMN,
+    MONTH_COLUMN,
+    ROLLUP_KEYS,
+    ROLLUP_LEVELS,
+    ROLLUP_METRICS
+)
+from parser.schema import concat_frames, to_compact, to_output
+from parser.storage import PartitionedStore
+from parser.writer import atomic_open
+
+
+class RollupStore:
+    """
+    Агрегаты истории по дням и месяцам в разрезе аккаунта,
+    типа площадки и категории.
+
+    Оба уровня лежат по файлу на месяц:
+    root/<уровень>/month=ГГГГ-ММ.parquet. update() пересчитывает
+    дневные строки только за даты текущего окна обновления (читая
+    их партиции сырых данных), а месячные - из дневных строк месяца,
+    поэтому стоимость обновления не зависит от глубины истории. Расход хранится
+    в микроединицах, в CSV выгружается в рублях с НДС.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        for level in ROLLUP_LEVELS:
+            (self.root / level).mkdir(parents=True, exist_ok=True)
+
+    def _month_path(self, level: str, month: str) -> Path:
+        """Защищенный метод. Возвращает путь к файлу месяца уровня."""
+        return self.root / level / f'month={month}.parquet'
+
+    def _write_month(self, df: pd.DataFrame, path: Path) -> None:
+        """
+        Защищенный метод. Атомарно записывает файл месяца
+        или удаляет его, если строк не осталось.
+        """
+        if df.empty:
+            path.unlink(missing_ok=True)
+            return
+        with atomic_open(path, 'wb') as file:
+            df.to_parquet(file, index=False)
+
+    def _sort(self, df: pd.DataFrame, period: str) -> pd.DataFrame:
+        """
+        Защищенный метод. Упорядочивает строки по периоду и разрезам.
+        Сравниваются значения, а не коды category: порядок кодов
+        зависит от того, в каком порядке строки попали в историю.
+        """
+        return to_compact(df.sort_values(
+            [period, *ROLLUP_KEYS], kind='stable',
+            key=lambda x: x.astype(str)
+        ))
+
+    def _aggregate(self, df: pd.DataFrame, period: str) -> pd.DataFrame:
+        """
+        Защищенный метод. Суммирует метрики по периоду и разрезам.
+        Пропуски в метриках считаются нулями, как в сумме pandas.
+        """
+        keys = [period, *ROLLUP_KEYS]
+        metrics = list(ROLLUP_METRICS)
+        df = df.fillna({column: 0 for column in metrics}).astype(
+            {column: 'int64' for column in metrics}
+        )
+        return to_compact(
+            df.groupby(keys, observed=True, sort=True)[metrics]
+            .sum()
+            .reset_index()
+        )
+
+    def months(
+        self,
+        level: str,
+        month_from: str | None = None,
+        month_to: str | None = None
+    ) -> list[str]:
+        """Возвращает отсортированный список месяцев уровня."""
+        months = sorted(
+            path.stem.split('=', 1)[1]
+            for path in (self.root / level).glob('month=*.parquet')
+        )
+        return [
+            month for month in months
+            if (month_from is None or month >= month_from)
+            and (month_to is None or month <= month_to)
+        ]
+
+    def is_empty(self) -> bool:
+        """Проверяет, есть ли хотя бы один дневной агрегат."""
+        return not self.months('daily')
+
+    def update(self, store: PartitionedStore, dates: list[str]) -> int:
+        """
+        Пересчитывает агрегаты за даты окна обновления.
+        Даты, которых в хранилище больше нет, удаляются из агрегатов.
+        Возвращает количество обновленных месяцев.
+        """
+        by_month: dict[str, list[str]] = {}
+        for date in sorted(set(dates)):
+            by_month.setdefault(date[:7], []).append(date)
+
+        for month, month_dates in by_month.items():
+            daily_path = self._month_path('daily', month)
+            frames = []
+            raw = store.read_dates(month_dates)
+            if not raw.empty:
+                frames.append(self._aggregate(raw, DATE_COLUMN))
+            if daily_path.exists():
+                old = pd.read_parquet(daily_path)
+                frames.append(old[~old[DATE_COLUMN].isin(month_dates)])
+            daily = concat_frames(frames)
+            if not daily.empty:
+                daily = self._sort(daily, DATE_COLUMN)
+            self._write_month(daily, daily_path)
+
+            monthly = pd.DataFrame()
+            if not daily.empty:
+                monthly = self._sort(self._aggregate(
+                    daily.assign(**{MONTH_COLUMN: month}), MONTH_COLUMN
+                ), MONTH_COLUMN)
+            self._write_month(monthly, self._month_path('monthly', month))
+        logging.info(f'Обновлено месяцев агрегатов: {len(by_month)}')
+        return len(by_month)
+
+    def export_csv(self, level: str, path: Path) -> None:
+        """
+        Выгружает агрегат уровня в CSV (cp1251, ';') с расходом
+        в рублях с НДС. Файл заменяется атомарно.
+        """
+        header = True
+        with atomic_open(
+            path, 'w', encoding='cp1251', errors='replace', newline=''
+        ) as file:
+            for month in self.months(level):
+                to_output(
+                    pd.read_parquet(self._month_path(level, month)),
+                    float_counters=False
+                ).to_csv(file, index=False, header=header, sep=';')
+                header = False
+        logging.info(f'Агрегат {level} выгружен в {path}')
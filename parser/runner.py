@@ -0,0 +1,149 @@
+import logging
+from contextlib import ExitStack
+
+from parser.constants import (
+    DEFAULT_FOLDER,
+    MAX_REPORTS_IN_QUEUE,
+    MAX_WORKERS,
+    YANDEX_DIRECT_URL
+)
+from parser.jobs import PortfolioJob
+from parser.metrics import RunMetrics
+from parser.rate_limiter import AdaptiveRateLimiter
+from parser.scheduler import ReportScheduler, ReportTask
+from parser.transport import DirectTransport
+from parser.utils import (
+    get_date_list,
+    get_shard_filename,
+    get_shard_logins
+)
+from parser.ya_direct import DirectSaveClient
+
+
+class PortfolioRunner:
+    """
+    Выгрузка нескольких портфелей одним запуском.
+
+    Для каждого портфеля создается свой DirectSaveClient (хранилище,
+    журнал, водяные знаки и файлы - свои), но все клиенты делят один
+    HTTP-транспорт с пулом соединений, один ограничитель темпа и одни
+    метрики запуска. Отчеты всех портфелей выполняются одним
+    планировщиком с общим пулом потоков: задачи перемешаны в одной
+    очереди (самые долгие - первыми), поэтому общее время близко
+    ко времени самого долгого отчета, а не к сумме запусков.
+
+    force_full и debug_dump передаются всем клиентам: все логины
+    выгружаются за полный период независимо от водяных знаков,
+    а сырые ответы портфеля сохраняются в job.filename_temp.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        jobs: list[PortfolioJob],
+        folder_name: str = DEFAULT_FOLDER,
+        max_workers: int = MAX_WORKERS,
+        incremental: bool = True,
+        force_full: bool = False,
+        debug_dump: bool = False,
+        shard: tuple[int, int] | None = None,
+        api_url: str = YANDEX_DIRECT_URL,
+        transport: DirectTransport | None = None,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+        use_report_cache: bool = True
+    ):
+        self.jobs = jobs
+        self.max_workers = max(1, max_workers)
+        self.transport = transport or DirectTransport(self.max_workers)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.metrics = RunMetrics()
+        self.clients = [
+            DirectSaveClient(
+                token,
+                get_date_list(job.days),
+                get_shard_logins(list(job.logins), *shard)
+                if shard else list(job.logins),
+                folder_name=folder_name,
+                max_workers=self.max_workers,
+                incremental=incremental,
+                force_full=force_full,
+                debug_dump=debug_dump,
+                transport=self.transport,
+                rate_limiter=self.rate_limiter,
+                use_report_cache=use_report_cache,
+                api_url=api_url,
+                metrics=self.metrics,
+                shard=shard,
+                report_fields=job.report_fields
+            )
+            for job in jobs
+        ]
+
+    def _request_report(self, task: ReportTask) -> tuple:
+        """Защищенный метод. Передает запрос клиенту задачи."""
+        return task.owner.request_report(task)
+
+    def _finish_task(self, task: ReportTask) -> None:
+        """Защищенный метод. Сообщает клиенту о завершении задачи."""
+        task.owner.finish_task(task)
+
+    def _take_unprocessed_tasks(self) -> list[ReportTask]:
+        """
+        Защищенный метод. Собирает у клиентов задачи логинов,
+        отчеты которых получены, но не обработаны.
+        """
+        return [
+            task for client in self.clients
+            for task in client.take_unprocessed_tasks()
+        ]
+
+    def run(self, resume: bool = False) -> None:
+        """
+        Выгружает и сохраняет все портфели. Ошибка подготовки одного
+        портфеля не останавливает остальные. Метрики запуска
+        сохраняются один раз на все портфели.
+        """
+        try:
+            prepared = []
+            for job, client in zip(self.jobs, self.clients):
+                try:
+                    date_ranges = client.begin_save(job.filename, resume)
+                except Exception as e:
+                    logging.error(f'Портфель {job.name} пропущен: {e}')
+                    continue
+                prepared.append((job, client, date_ranges))
+
+            scheduler = ReportScheduler(
+                self._request_report,
+                max_in_flight=MAX_REPORTS_IN_QUEUE,
+                max_workers=self.max_workers,
+                rate_limiter=self.rate_limiter
+            )
+            with self.metrics.timer('fetch'), ExitStack() as stack:
+                tasks = []
+                for job, client, date_ranges in prepared:
+                    tasks.extend(stack.enter_context(client.fetch_session(
+                        get_shard_filename(job.filename_temp, client.shard),
+                        date_ranges
+                    )))
+                tasks.sort(
+                    key=lambda task: task.owner.estimate_task_seconds(task),
+                    reverse=True
+                )
+                logging.info(
+                    f'Портфелей в запуске: {len(prepared)}, '
+                    f'отчетов в общей очереди: {len(tasks)}'
+                )
+                scheduler.run_with_retries(
+                    tasks,
+                    self._finish_task,
+                    collect_failed=self._take_unprocessed_tasks
+                )
+            self.transport.log_stats()
+
+            for job, client, _ in prepared:
+                logging.info(f'Сохранение портфеля {job.name}')
+                client.end_save(client.get_fetched_data())
+        finally:
+            if self.clients:
+                self.clients[0].save_metrics()
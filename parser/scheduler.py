@@ -0,0 +1,247 @@
+import datetime as dt
+import heapq
+import logging
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from parser.constants import (
+    DATE_FORMAT,
+    FAILED_RETRY_PASSES,
+    MAX_REPORTS_IN_QUEUE,
+    RATE_LIMIT_MAX_RETRIES
+)
+from parser.rate_limiter import AdaptiveRateLimiter
+
+
+@dataclass
+class ReportTask:
+    """
+    Задача на получение одного отчета для логина за период.
+    owner - объект, поставивший задачу (клиент портфеля), когда
+    задачи нескольких клиентов выполняются одним планировщиком.
+    """
+
+    login: str
+    date_from: str
+    date_to: str
+    status: str = 'pending'
+    polls: int = 0
+    throttled: int = 0
+    next_poll: float = 0.0
+    queued_at: float = field(default_factory=time.monotonic)
+    result: Any = None
+    children: list['ReportTask'] = field(default_factory=list)
+    owner: Any = None
+
+    @property
+    def days(self) -> int:
+        """Количество дней в периоде задачи."""
+        date_from = dt.datetime.strptime(self.date_from, DATE_FORMAT)
+        date_to = dt.datetime.strptime(self.date_to, DATE_FORMAT)
+        return (date_to - date_from).days + 1
+
+    def split(self) -> list['ReportTask']:
+        """Делит период задачи пополам. Однодневную задачу не делит."""
+        if self.days < 2:
+            return []
+        date_from = dt.datetime.strptime(self.date_from, DATE_FORMAT)
+        middle = date_from + dt.timedelta(days=self.days // 2 - 1)
+        next_day = middle + dt.timedelta(days=1)
+        self.children = [
+            ReportTask(
+                self.login,
+                self.date_from,
+                middle.strftime(DATE_FORMAT),
+                owner=self.owner
+            ),
+            ReportTask(
+                self.login,
+                next_day.strftime(DATE_FORMAT),
+                self.date_to,
+                owner=self.owner
+            )
+        ]
+        return self.children
+
+    def leaves(self) -> list['ReportTask']:
+        """Возвращает конечные задачи по порядку дат."""
+        if not self.children:
+            return [self]
+        return [leaf for child in self.children for leaf in child.leaves()]
+
+
+class ReportScheduler:
+    """
+    Планировщик офлайн-отчетов Яндекс.Директ.
+
+    Сначала ставит в очередь API отчеты для нескольких логинов
+    (не больше max_in_flight одновременно), затем опрашивает их
+    по кругу, возвращаясь к каждому только когда истек его retryIn.
+    Формирование отчетов на стороне сервера идет параллельно,
+    и общее время приближается ко времени самого долгого отчета.
+
+    request_func принимает ReportTask и возвращает кортеж
+    (состояние, retryIn, данные), где состояние - 'ready',
+    'building', 'throttled', 'too_large' или 'failed'. Отчет в состоянии
+    'throttled' отклонен из-за ограничений API и повторяется
+    через retryIn секунд, не больше RATE_LIMIT_MAX_RETRIES раз.
+    Отчет 'too_large' не успел сформироваться: его период делится
+    пополам, и половины ставятся в очередь первыми.
+    Если передан rate_limiter, число отчетов в очереди
+    дополнительно ограничено его текущей concurrency.
+    on_finish, если передан в run(), вызывается для каждой задачи,
+    перешедшей в 'done' или 'failed', сразу по ее завершении.
+    """
+
+    def __init__(
+        self,
+        request_func: Callable[[ReportTask], tuple[str, int, Any]],
+        max_in_flight: int = MAX_REPORTS_IN_QUEUE,
+        max_workers: int = 1,
+        rate_limiter: AdaptiveRateLimiter | None = None
+    ):
+        self.request_func = request_func
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = rate_limiter
+        self._on_finish: Callable[[ReportTask], None] | None = None
+
+    def _in_flight_limit(self) -> int:
+        """Защищенный метод. Текущий лимит отчетов в очереди API."""
+        if self.rate_limiter is None:
+            return self.max_in_flight
+        return min(self.max_in_flight, self.rate_limiter.concurrency)
+
+    def _handle_result(
+        self,
+        task: ReportTask,
+        future,
+        waiting: list,
+        pending: deque
+    ) -> None:
+        """Защищенный метод. Обрабатывает ответ API на опрос отчета."""
+        try:
+            state, retry_in, payload = future.result()
+        except Exception as e:
+            logging.error(f'ошибка: {e}')
+            state, retry_in, payload = 'failed', 0, None
+
+        task.polls += 1
+        if state == 'throttled':
+            task.throttled += 1
+            if task.throttled > RATE_LIMIT_MAX_RETRIES:
+                logging.error(
+                    f'Отчет для аккаунта {task.login} отклонен: '
+                    'превышено число повторов из-за ограничений API'
+                )
+                task.status = 'failed'
+                self._finish(task)
+                return
+            state = 'building'
+        if state == 'building':
+            task.status = 'queued'
+            task.next_poll = time.monotonic() + retry_in
+            heapq.heappush(waiting, (task.next_poll, id(task), task))
+        elif state == 'ready':
+            task.status = 'done'
+            task.result = payload
+            self._finish(task)
+        elif state == 'too_large' and task.split():
+            logging.warning(
+                f'Отчет для аккаунта {task.login} разбит на периоды '
+                f'{task.children[0].days} и {task.children[1].days} дн.'
+            )
+            task.status = 'split'
+            pending.extendleft(reversed(task.children))
+        else:
+            task.status = 'failed'
+            self._finish(task)
+
+    def _finish(self, task: ReportTask) -> None:
+        """Защищенный метод. Сообщает о завершении задачи."""
+        if self._on_finish is not None:
+            self._on_finish(task)
+
+    def run(
+        self,
+        tasks: list[ReportTask],
+        on_finish: Callable[[ReportTask], None] | None = None
+    ) -> list[ReportTask]:
+        """
+        Выполняет все задачи и возвращает их в исходном порядке.
+        У выполненных задач status='done', данные лежат в result.
+        У разбитых задач status='split', части - в children.
+        """
+        self._on_finish = on_finish
+        pending = deque(tasks)
+        waiting = []
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or waiting or running:
+                while pending and (
+                    len(waiting) + len(running) < self._in_flight_limit()
+                ):
+                    task = pending.popleft()
+                    task.next_poll = task.queued_at = time.monotonic()
+                    heapq.heappush(waiting, (task.next_poll, id(task), task))
+
+                now = time.monotonic()
+                while waiting and waiting[0][0] <= now and (
+                    len(running) < self.max_workers
+                ):
+                    _, _, task = heapq.heappop(waiting)
+                    running[pool.submit(self.request_func, task)] = task
+
+                timeout = None
+                if waiting and len(running) < self.max_workers:
+                    timeout = max(0.0, waiting[0][0] - now)
+
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+
+                done, _ = wait(
+                    running, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    self._handle_result(
+                        running.pop(future), future, waiting, pending
+                    )
+
+        return tasks
+
+    def run_with_retries(
+        self,
+        tasks: list[ReportTask],
+        on_finish: Callable[[ReportTask], None] | None = None,
+        passes: int = FAILED_RETRY_PASSES,
+        collect_failed: Callable[[], list[ReportTask]] | None = None
+    ) -> list[ReportTask]:
+        """
+        Выполняет задачи, затем до passes раз повторяет
+        не удавшиеся конечные задачи. Возвращает tasks.
+        collect_failed вызывается перед каждым повтором и возвращает
+        еще задачи для повтора - например, отчеты, полученные,
+        но не обработанные после выгрузки.
+        """
+        self.run(tasks, on_finish)
+        for _ in range(passes):
+            failed = [
+                leaf for task in tasks for leaf in task.leaves()
+                if leaf.status == 'failed'
+            ]
+            if collect_failed is not None:
+                failed.extend(collect_failed())
+            if not failed:
+                break
+            logging.warning(f'Повторная выгрузка {len(failed)} отчетов')
+            for task in failed:
+                task.status = 'pending'
+                task.polls = 0
+                task.throttled = 0
+            self.run(failed, on_finish)
+        return tasks
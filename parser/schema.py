@@ -0,0 +1,127 @@
+import hashlib
+from typing import Any
+
+import pandas as pd
+from pandas.api.types import is_float_dtype
+
+from parser.constants import (
+    COST_COLUMN,
+    MONEY_MICROS,
+    REPORT_FLOAT_OUTPUT_COLUMNS,
+    REPORT_SCHEMA,
+    VAT_RATE
+)
+
+
+def to_compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Функция приводит колонки строк отчета к REPORT_SCHEMA.
+
+    Текстовые колонки становятся category без неиспользуемых
+    категорий, счетчики - int32, расход - int64 в микроединицах.
+    Целочисленные колонки с пропусками не приводятся.
+    """
+    for column, dtype in REPORT_SCHEMA.items():
+        if column not in df:
+            continue
+        series = df[column]
+        if dtype == 'category':
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                df[column] = series.cat.remove_unused_categories()
+            else:
+                df[column] = series.astype('category')
+        elif series.dtype != dtype and not series.hasnans:
+            if is_float_dtype(series):
+                series = series.round()
+            df[column] = series.astype(dtype)
+    return df
+
+
+def from_output(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Функция читает строки в формате выгрузки (CSV или партиции,
+    записанные до REPORT_SCHEMA): расход в рублях с НДС переводится
+    обратно в микроединицы без НДС, затем колонки приводятся
+    к REPORT_SCHEMA.
+    """
+    if COST_COLUMN in df and is_float_dtype(df[COST_COLUMN]):
+        df[COST_COLUMN] = df[COST_COLUMN] * MONEY_MICROS / VAT_RATE
+    return to_compact(df)
+
+
+def to_output(
+    df: pd.DataFrame,
+    float_counters: bool = True
+) -> pd.DataFrame:
+    """
+    Функция готовит строки к выгрузке в CSV в прежнем виде: расход
+    переводится в рубли с НДС тем же выражением, что и раньше,
+    колонки REPORT_FLOAT_OUTPUT_COLUMNS пишутся как float, поэтому
+    значения в CSV записываются так же, как раньше. Порядок строк
+    задает вызывающий код (хранилище выгружает их по дате, внутри
+    даты - по аккаунту). С float_counters=False счетчики остаются
+    целыми (для новых выгрузок без требований совместимости).
+    Исходный DataFrame не меняется.
+    """
+    columns = {}
+    if float_counters:
+        columns = {
+            column: df[column].astype('float64')
+            for column in REPORT_FLOAT_OUTPUT_COLUMNS
+            if column in df
+        }
+    if COST_COLUMN in df:
+        columns[COST_COLUMN] = df[COST_COLUMN] * VAT_RATE / MONEY_MICROS
+    return df.assign(**columns)
+
+
+def concat_frames(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Функция объединяет DataFrame, сохраняя колонки category.
+
+    pd.concat превращает category с разными наборами категорий
+    в object, поэтому категории колонок сначала объединяются.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    frames = [frame.copy(deep=False) for frame in frames]
+    for column in frames[0].columns:
+        if not all(
+            column in frame
+            and isinstance(frame[column].dtype, pd.CategoricalDtype)
+            for frame in frames
+        ):
+            continue
+        categories = frames[0][column].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[column].cat.categories)
+        for frame in frames:
+            frame[column] = frame[column].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def fingerprint_groups(
+    df: pd.DataFrame,
+    by: str | list[str]
+) -> dict[Any, str]:
+    """
+    Функция возвращает отпечатки содержимого строк каждой группы:
+    хэш значений по колонкам в порядке имен и по строкам в порядке
+    следования. Хэши строк считаются одним векторным проходом,
+    по группам только склеиваются. Не зависит от кодов category
+    и ширины целых типов, поэтому строки из ответа API и те же
+    строки, прочитанные из партиции, дают один отпечаток.
+    """
+    columns = sorted(df.columns)
+    hashes = pd.util.hash_pandas_object(
+        df[columns], index=False
+    ).to_numpy()
+    suffix = ','.join(columns).encode('utf-8')
+    fingerprints = {}
+    groups = df.groupby(by, observed=True, sort=False).indices
+    for key, positions in groups.items():
+        digest = hashlib.md5(hashes[positions].tobytes())
+        digest.update(suffix)
+        fingerprints[key] = digest.hexdigest()
+    return fingerprints
@@ -0,0 +1,177 @@
+import datetime as dt
+import json
+import logging
+import threading
+from pathlib import Path
+
+from parser.constants import (
+    DATE_FORMAT,
+    DORMANT_EMPTY_RUNS,
+    DORMANT_POLL_INTERVAL_DAYS,
+    REPORT_CHUNK_TARGET_BYTES,
+    STATS_EMA_WEIGHT
+)
+from parser.writer import atomic_open
+
+
+class LoginStatsStore:
+    """
+    Накопленная статистика выгрузок по логинам.
+
+    Для каждого логина хранятся сглаженные (EMA) объем отчета и число
+    строк на один день, время формирования отчета на один день и число
+    опросов retryIn, ограничение длины периода, после которого API
+    отвечало 502, а также число выгрузок подряд без строк и дата
+    последнего опроса. По ним подбирается длина периода, на которую
+    режется выгрузка, порядок отчетов (самые долгие - первыми)
+    и логины, которые можно опрашивать реже.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: dict[str, dict] = self._load()
+        self._changed: set[str] = set()
+
+    def _load(self) -> dict[str, dict]:
+        """Защищенный метод. Загружает статистику с диска."""
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logging.warning(f'Статистика логинов не прочитана: {e}')
+            return {}
+
+    def _update_ema(self, stats: dict, key: str, value: float) -> None:
+        """Защищенный метод. Обновляет сглаженное значение показателя."""
+        previous = stats.get(key)
+        if previous is None:
+            stats[key] = value
+        else:
+            stats[key] = (
+                STATS_EMA_WEIGHT * value + (1 - STATS_EMA_WEIGHT) * previous
+            )
+
+    def get(self, login: str) -> dict:
+        """Возвращает копию статистики логина."""
+        with self._lock:
+            return dict(self._data.get(login, {}))
+
+    def get_chunk_days(self, login: str, total_days: int) -> int:
+        """
+        Возвращает длину периода одного отчета для логина:
+        весь период, если он укладывается в REPORT_CHUNK_TARGET_BYTES
+        и раньше не было ответов 502, иначе меньше.
+        """
+        stats = self.get(login)
+        chunk_days = total_days
+        bytes_per_day = stats.get('bytes_per_day')
+        if bytes_per_day:
+            chunk_days = int(REPORT_CHUNK_TARGET_BYTES // bytes_per_day)
+        if stats.get('max_chunk_days'):
+            chunk_days = min(chunk_days, stats['max_chunk_days'])
+        return max(1, min(total_days, chunk_days))
+
+    def record_report(self, login: str, days: int, size_bytes: int) -> None:
+        """
+        Учитывает размер полученного отчета за days дней.
+        Успешный отчет на пределе max_chunk_days увеличивает предел
+        на день, чтобы разовый 502 не дробил выгрузку навсегда.
+        """
+        with self._lock:
+            stats = self._data.setdefault(login, {})
+            self._changed.add(login)
+            self._update_ema(stats, 'bytes_per_day', size_bytes / max(1, days))
+            if days >= stats.get('max_chunk_days', days + 1):
+                stats['max_chunk_days'] = days + 1
+
+    def record_build(
+        self,
+        login: str,
+        days: int,
+        seconds: float,
+        polls: int
+    ) -> None:
+        """
+        Учитывает время от постановки отчета за days дней в очередь
+        до его готовности и число опросов, которое на это ушло.
+        """
+        with self._lock:
+            stats = self._data.setdefault(login, {})
+            self._changed.add(login)
+            self._update_ema(
+                stats, 'build_seconds_per_day', seconds / max(1, days)
+            )
+            self._update_ema(stats, 'polls', polls)
+
+    def record_rows(self, login: str, days: int, rows: int) -> None:
+        """
+        Учитывает число строк, выгруженных для логина за days дней.
+        Выгрузка без строк продлевает серию пустых выгрузок.
+        """
+        with self._lock:
+            stats = self._data.setdefault(login, {})
+            self._changed.add(login)
+            self._update_ema(stats, 'rows_per_day', rows / max(1, days))
+            stats['empty_runs'] = 0 if rows else stats.get('empty_runs', 0) + 1
+            stats['last_polled'] = dt.date.today().strftime(DATE_FORMAT)
+
+    def estimate_seconds(self, login: str, days: int) -> float:
+        """
+        Возвращает ожидаемое время формирования отчета за days дней.
+        Для логина без истории - бесконечность: неизвестный логин
+        может оказаться самым долгим, поэтому ставится первым.
+        """
+        per_day = self.get(login).get('build_seconds_per_day')
+        if per_day is None:
+            return float('inf')
+        return per_day * days
+
+    def is_dormant(self, login: str) -> bool:
+        """
+        Проверяет, что последние DORMANT_EMPTY_RUNS выгрузок логина
+        не вернули ни одной строки.
+        """
+        return self.get(login).get('empty_runs', 0) >= DORMANT_EMPTY_RUNS
+
+    def needs_poll(self, login: str) -> bool:
+        """
+        Проверяет, нужно ли выгружать логин в этом запуске: активные
+        логины выгружаются всегда, спящие - раз в
+        DORMANT_POLL_INTERVAL_DAYS дней.
+        """
+        if not self.is_dormant(login):
+            return True
+        last_polled = self.get(login).get('last_polled')
+        if last_polled is None:
+            return True
+        days = (
+            dt.date.today()
+            - dt.datetime.strptime(last_polled, DATE_FORMAT).date()
+        ).days
+        return days >= DORMANT_POLL_INTERVAL_DAYS
+
+    def record_timeout(self, login: str, days: int) -> None:
+        """Учитывает ответ 502 на отчет за days дней."""
+        with self._lock:
+            stats = self._data.setdefault(login, {})
+            self._changed.add(login)
+            stats['max_chunk_days'] = max(
+                1, min(days // 2, stats.get('max_chunk_days', days))
+            )
+
+    def save(self) -> None:
+        """
+        Атомарно сохраняет статистику. Перед записью файл перечитывается
+        и обновляются только логины, изменившиеся в этом процессе, чтобы
+        шарды, работающие параллельно, не затирали статистику друг друга.
+        """
+        with self._lock:
+            data = self._load()
+            data.update({login: self._data[login] for login in self._changed})
+            self._data = data
+            self._changed.clear()
+            with atomic_open(self.path, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False, indent=4)
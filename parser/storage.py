@@ -0,0 +1,632 @@
+import json
+import logging
+import shutil
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import IO, Iterator
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from parser.constants import (
+    ACCOUNT_COLUMN,
+    CATEGORY_COLUMN,
+    COST_COLUMN,
+    COST_UNITS_METADATA_KEY,
+    CSV_COPY_CHUNK_BYTES,
+    CSV_INDEX_FILE,
+    DATE_COLUMN,
+    FINGERPRINT_METADATA_KEY,
+    MERGE_STATE_FILE,
+    PLATFORM_COLUMN,
+    REPORT_SCHEMA,
+    STORE_BATCH_DATES
+)
+from parser.schema import (
+    concat_frames,
+    fingerprint_groups,
+    from_output,
+    to_compact,
+    to_output
+)
+from parser.writer import atomic_open
+
+
+class PartitionedStore:
+    """
+    Хранилище истории отчетов, разбитое по датам.
+
+    Строки каждой даты лежат в отдельном Parquet-файле
+    root/date=ГГГГ-ММ-ДД.parquet и отсортированы по аккаунту.
+    Колонки хранятся в компактных типах REPORT_SCHEMA (текст - словарем,
+    расход - в микроединицах), в CSV выгружаются в прежнем виде.
+    Обновление заменяет строки только тех пар (дата, аккаунт), которые
+    выгружены заново, и переписывает только файлы этих дат, поэтому
+    время записи зависит от окна обновления, а не от объема истории.
+    В метаданных партиции хранятся отпечатки строк каждого аккаунта:
+    пары, выгруженные заново без изменений, не переписываются.
+    Хранилище прежней раскладки (файл на пару дата-аккаунт)
+    переводится в файлы дат при открытии. С read_only=True открытие
+    ничего не пишет на диск (папка не создается, раскладка
+    не переводится) - так хранилище открывается для запросов,
+    которые могут идти параллельно с выгрузкой.
+    """
+
+    def __init__(self, root: Path, read_only: bool = False):
+        self.root = Path(root)
+        if read_only:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._migrate_layout()
+
+    def _migrate_layout(self) -> None:
+        """
+        Защищенный метод. Переносит партиции прежней раскладки
+        root/date=ГГГГ-ММ-ДД/<логин>.parquet в файлы дат.
+        Если файл даты уже есть (история снова перенесена из CSV),
+        из прежних партиций добавляются только аккаунты, которых
+        в нем нет. Папка даты удаляется после записи файла, поэтому
+        прерванный перенос продолжается при следующем открытии.
+        """
+        date_dirs = sorted(
+            path for path in self.root.glob('date=*') if path.is_dir()
+        )
+        for date_dir in date_dirs:
+            date = date_dir.name.split('=', 1)[1]
+            path = self._partition_path(date)
+            old = self._read_paths(sorted(date_dir.glob('*.parquet')))
+            if not old.empty:
+                frames = [old]
+                if path.exists():
+                    current = self._read_partitions([date])
+                    frames = [current, old[
+                        ~old[ACCOUNT_COLUMN].isin(current[ACCOUNT_COLUMN])
+                    ]]
+                merged = concat_frames(frames).sort_values(
+                    ACCOUNT_COLUMN, kind='stable', key=lambda x: x.astype(str)
+                )
+                self._write_partition(to_compact(merged), path)
+            shutil.rmtree(date_dir)
+        if date_dirs:
+            logging.info(
+                f'Хранилище {self.root.name} переведено на файлы дат, '
+                f'дат: {len(date_dirs)}'
+            )
+
+    def _partition_path(self, date: str) -> Path:
+        """Защищенный метод. Возвращает путь к партиции даты."""
+        return self.root / f'date={date}.parquet'
+
+    def _read_fingerprints(self, date: str) -> dict[str, str] | None:
+        """
+        Защищенный метод. Читает отпечатки аккаунтов из метаданных
+        партиции даты, не читая строк. Для отсутствующей партиции
+        возвращает пустой словарь, для партиции без отпечатков
+        (записанной раньше) - None.
+        """
+        path = self._partition_path(date)
+        if not path.exists():
+            return {}
+        metadata = pq.read_schema(path).metadata or {}
+        value = metadata.get(FINGERPRINT_METADATA_KEY.encode('utf-8'))
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def _write_partition(self, df: pd.DataFrame, path: Path) -> None:
+        """
+        Защищенный метод. Атомарно записывает одну партицию
+        вместе с отпечатками строк аккаунтов и единицами расхода.
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            FINGERPRINT_METADATA_KEY: json.dumps(
+                fingerprint_groups(df, ACCOUNT_COLUMN)
+            ),
+            COST_UNITS_METADATA_KEY: 'micros'
+        })
+        with atomic_open(path, 'wb') as file:
+            pq.write_table(table, file)
+
+    def _read_table(
+        self,
+        path: Path,
+        columns: list[str] | None = None,
+        filters: list[tuple] | None = None
+    ) -> pa.Table:
+        """
+        Защищенный метод. Читает партицию как таблицу Arrow.
+        columns и filters передаются в pyarrow: читаются только
+        нужные колонки, строки отбираются при чтении.
+        Партиции, записанные до перехода на REPORT_SCHEMA (расход
+        в рублях с НДС), приводятся к ней при чтении. Они узнаются
+        по метаданным, а не по типу расхода: в микроединицах расход
+        тоже хранится как float, если в партиции есть пропуски.
+        """
+        table = pq.read_table(path, columns=columns, filters=filters)
+        metadata = table.schema.metadata or {}
+        legacy = not any(
+            key.encode('utf-8') in metadata
+            for key in (COST_UNITS_METADATA_KEY, FINGERPRINT_METADATA_KEY)
+        )
+        if legacy and COST_COLUMN in table.column_names:
+            table = pa.Table.from_pandas(
+                from_output(table.to_pandas()), preserve_index=False
+            )
+        return table
+
+    def _read_partitions(self, dates: list[str]) -> pd.DataFrame:
+        """
+        Защищенный метод. Читает партиции дат в один DataFrame.
+        Таблицы объединяются в Arrow и переводятся в pandas один раз,
+        словари текстовых колонок объединяются без перехода в object.
+        """
+        return self._read_paths(
+            [self._partition_path(date) for date in dates]
+        )
+
+    def _read_paths(
+        self,
+        paths: list[Path],
+        columns: list[str] | None = None,
+        filters: list[tuple] | None = None
+    ) -> pd.DataFrame:
+        """Защищенный метод. Читает файлы партиций в один DataFrame."""
+        tables = [self._read_table(path, columns, filters) for path in paths]
+        if not tables:
+            return pd.DataFrame()
+        return pa.concat_tables(
+            tables, promote_options='permissive'
+        ).to_pandas()
+
+    def _merge_partitions(
+        self,
+        df: pd.DataFrame,
+        replaced: dict[str, set[str]]
+    ) -> list[tuple[str, str]]:
+        """
+        Защищенный метод. Переписывает партиции дат из replaced,
+        удаляя строки перечисленных аккаунтов и добавляя строки df.
+
+        Пары (дата, аккаунт), отпечаток новых строк которых совпал
+        с отпечатком в партиции, пропускаются; дата, в которой
+        не изменилась ни одна пара, не переписывается.
+        Возвращает список измененных пар (дата, аккаунт).
+        """
+        new_parts = {}
+        fingerprints = {}
+        if not df.empty:
+            df = df.dropna(subset=[DATE_COLUMN, ACCOUNT_COLUMN])
+            new_parts = dict(tuple(
+                df.groupby(DATE_COLUMN, sort=True, observed=True)
+            ))
+            fingerprints = fingerprint_groups(
+                df, [DATE_COLUMN, ACCOUNT_COLUMN]
+            )
+        for date, part in new_parts.items():
+            replaced.setdefault(date, set()).update(
+                part[ACCOUNT_COLUMN].unique()
+            )
+
+        changed = []
+        for date in sorted(replaced):
+            path = self._partition_path(date)
+            new_part = new_parts.get(date, pd.DataFrame())
+            stored = self._read_fingerprints(date)
+            logins = replaced[date]
+            if stored is not None:
+                logins = {
+                    login for login in logins
+                    if fingerprints.get((date, login)) != stored.get(login)
+                }
+            if not logins:
+                continue
+            changed.extend((date, login) for login in sorted(logins))
+            frames = []
+            if not new_part.empty:
+                frames.append(new_part[new_part[ACCOUNT_COLUMN].isin(logins)])
+            if path.exists():
+                old = self._read_partitions([date])
+                frames.append(old[~old[ACCOUNT_COLUMN].isin(logins)])
+            frames = [frame for frame in frames if not frame.empty]
+            if not frames:
+                path.unlink(missing_ok=True)
+                continue
+            merged = concat_frames(frames).sort_values(
+                ACCOUNT_COLUMN, kind='stable', key=lambda x: x.astype(str)
+            )
+            self._write_partition(to_compact(merged), path)
+        return changed
+
+    def dates(
+        self,
+        date_from: str | None = None,
+        date_to: str | None = None
+    ) -> list[str]:
+        """
+        Возвращает отсортированный список дат в хранилище.
+        Границы диапазона включительные, отбор - бинарным поиском
+        по отсортированному списку партиций.
+        """
+        dates = sorted(
+            path.stem.split('=', 1)[1]
+            for path in self.root.glob('date=*.parquet')
+        )
+        start = bisect_left(dates, date_from) if date_from else 0
+        end = bisect_right(dates, date_to) if date_to else len(dates)
+        return dates[start:end]
+
+    def columns(self, dates: list[str] | None = None) -> list[str]:
+        """
+        Возвращает колонки истории - объединение колонок партиций
+        дат dates (по умолчанию всех; читаются только схемы файлов):
+        колонки REPORT_SCHEMA в ее порядке, остальные - в конце
+        в порядке появления. Партиции разных профилей отчета
+        (REPORT_PROFILES) могут различаться набором колонок.
+        """
+        found = {}
+        for date in self.dates() if dates is None else dates:
+            for name in pq.read_schema(self._partition_path(date)).names:
+                found.setdefault(name, None)
+        return [column for column in REPORT_SCHEMA if column in found] + [
+            column for column in found if column not in REPORT_SCHEMA
+        ]
+
+    def is_empty(self) -> bool:
+        """Проверяет, есть ли в хранилище хотя бы одна партиция."""
+        return next(self.root.glob('date=*.parquet'), None) is None
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Записывает строки в партиции дат, заменяя строки тех же
+        пар (дата, аккаунт). Возвращает количество записанных партиций.
+        """
+        changed = self._merge_partitions(df, {})
+        return len({date for date, _ in changed})
+
+    def upsert(
+        self,
+        df: pd.DataFrame,
+        refreshed: dict[str, list[str]]
+    ) -> list[tuple[str, str]]:
+        """
+        Заменяет строки обновленных логинов за обновленные даты.
+
+        refreshed - словарь {логин: список дат}, выгруженных заново.
+        Старые строки этих пар удаляются, даже если в новых данных
+        строк за дату нет. Пары, пришедшие без изменений,
+        не переписываются. Возвращает список измененных пар
+        (дата, логин).
+        """
+        replaced: dict[str, set[str]] = {}
+        for login, dates in refreshed.items():
+            for date in dates:
+                replaced.setdefault(date, set()).add(login)
+        total = sum(len(logins) for logins in replaced.values())
+        changed = self._merge_partitions(df, replaced)
+        logging.info(
+            f'Изменено пар (дата, логин): {len(changed)} из {total}, '
+            f'партиций: {len({date for date, _ in changed})}'
+        )
+        return changed
+
+    def read_dates(self, dates: list[str]) -> pd.DataFrame:
+        """Читает историю за перечисленные даты, которые есть в хранилище."""
+        return self._read_partitions(
+            [date for date in sorted(set(dates))
+             if self._partition_path(date).exists()]
+        )
+
+    def has_accounts(self, date: str, logins: set[str]) -> bool:
+        """
+        Проверяет по метаданным партиции, не читая строк, есть ли
+        в дате строки хотя бы одного из логинов. Для партиций
+        без отпечатков аккаунтов (записанных раньше) возвращает True.
+        """
+        stored = self._read_fingerprints(date)
+        return stored is None or not logins.isdisjoint(stored)
+
+    def iter_query(
+        self,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        logins: list[str] | None = None,
+        categories: list[str] | None = None,
+        platforms: list[str] | None = None,
+        columns: list[str] | None = None,
+        batch_dates: int = STORE_BATCH_DATES
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Отдает пачками строки истории, подходящие под условия.
+
+        Даты отбираются по именам партиций, логины - по отпечаткам
+        аккаунтов в метаданных партиций, поэтому партиции вне
+        диапазона и без нужных логинов не открываются. Остальные
+        условия (категория, тип площадки) и колонки columns
+        передаются в pyarrow и применяются при чтении.
+        Пачка - до batch_dates партиций; пустые пачки не отдаются.
+        """
+        dates = self.dates(date_from, date_to)
+        if logins is not None:
+            wanted = set(logins)
+            dates = [
+                date for date in dates if self.has_accounts(date, wanted)
+            ]
+        filters = [
+            (column, 'in', list(values))
+            for column, values in (
+                (ACCOUNT_COLUMN, logins),
+                (CATEGORY_COLUMN, categories),
+                (PLATFORM_COLUMN, platforms)
+            )
+            if values is not None
+        ]
+        if columns is not None:
+            columns = list(columns)
+        for start in range(0, len(dates), batch_dates):
+            batch = self._read_paths(
+                [
+                    self._partition_path(date)
+                    for date in dates[start:start + batch_dates]
+                ],
+                columns,
+                filters or None
+            )
+            if not batch.empty:
+                yield to_compact(batch)
+
+    def _stored_accounts(self, date: str) -> set[str]:
+        """
+        Защищенный метод. Возвращает аккаунты партиции даты,
+        по возможности не читая строк (по отпечаткам).
+        """
+        fingerprints = self._read_fingerprints(date)
+        if fingerprints is not None:
+            return set(fingerprints)
+        return {
+            str(account) for account in self._read_paths(
+                [self._partition_path(date)], columns=[ACCOUNT_COLUMN]
+            )[ACCOUNT_COLUMN].unique()
+        }
+
+    def merge_from(self, stores: list['PartitionedStore']) -> list[str]:
+        """
+        Собирает хранилище из хранилищ-шардов с непересекающимися
+        логинами. Строки сводятся по парам (дата, аккаунт): аккаунты
+        даты, которые есть в шардах, заменяются их строками, а строки
+        аккаунтов, которых в шардах за дату нет (например, логин
+        не выгрузился в своем шарде или история перенесена из CSV),
+        остаются как есть. Удаляются только аккаунты, которые прошлая
+        сборка взяла из шардов, а теперь их в шардах за дату нет.
+
+        Отпечаток даты (время изменения партиции в каждом шарде)
+        и аккаунты, взятые из шардов, сохраняются в MERGE_STATE_FILE,
+        поэтому читаются только даты, которые изменились хотя бы
+        в одном шарде с прошлой сборки. Возвращает список
+        переписанных дат.
+        """
+        state_path = self.root / MERGE_STATE_FILE
+        try:
+            with open(state_path, encoding='utf-8') as file:
+                state = json.load(file)
+        except (OSError, ValueError):
+            state = {}
+
+        dates = set(self.dates())
+        for store in stores:
+            dates.update(store.dates())
+        changed = set()
+        for date in sorted(dates):
+            sources = [store._partition_path(date) for store in stores]
+            fingerprint = [
+                path.stat().st_mtime_ns if path.exists() else 0
+                for path in sources
+            ]
+            previous = state.get(date)
+            if isinstance(previous, list):
+                # Состояние прежней сборки, заменявшей партицию целиком.
+                previous = {
+                    'mtimes': previous,
+                    'accounts': sorted(self._stored_accounts(date))
+                }
+            if previous is None and not any(fingerprint):
+                continue
+            unchanged = (
+                previous is not None
+                and previous['mtimes'] == fingerprint
+                and self._partition_path(date).exists()
+            )
+            if unchanged:
+                state[date] = previous
+                continue
+            merged = self._read_paths(
+                [source for source in sources if source.exists()]
+            )
+            accounts = set()
+            if not merged.empty:
+                accounts = {
+                    str(account)
+                    for account in merged[ACCOUNT_COLUMN].unique()
+                }
+            dropped = set(previous['accounts'] if previous else []) - accounts
+            changed.update(
+                changed_date for changed_date, _ in self._merge_partitions(
+                    merged, {date: dropped}
+                )
+            )
+            if accounts:
+                state[date] = {
+                    'mtimes': fingerprint, 'accounts': sorted(accounts)
+                }
+            else:
+                state.pop(date, None)
+
+        with atomic_open(state_path, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        logging.info(
+            f'Собрано из {len(stores)} шардов, '
+            f'обновлено партиций: {len(changed)}'
+        )
+        return sorted(changed)
+
+    def _load_csv_index(self, path: Path) -> dict | None:
+        """
+        Защищенный метод. Читает смещения месяцев прошлой выгрузки
+        в CSV path. Возвращает None, если индекса нет или файл
+        с тех пор менялся (не совпали имя, размер или время изменения).
+        """
+        try:
+            with open(self.root / CSV_INDEX_FILE, encoding='utf-8') as file:
+                index = json.load(file)
+            stat = path.stat()
+        except (OSError, ValueError):
+            return None
+        if (index.get('file'), index.get('size'), index.get('mtime_ns')) != (
+            path.name, stat.st_size, stat.st_mtime_ns
+        ):
+            return None
+        return index
+
+    def _copy_head(self, path: Path, target: IO[bytes], size: int) -> None:
+        """Защищенный метод. Копирует первые size байт файла в target."""
+        with open(path, 'rb') as file:
+            while size > 0:
+                chunk = file.read(min(size, CSV_COPY_CHUNK_BYTES))
+                if not chunk:
+                    raise OSError(f'{path} короче, чем записано в индексе')
+                target.write(chunk)
+                size -= len(chunk)
+
+    def _encode_csv(self, df: pd.DataFrame, header: bool) -> bytes:
+        """
+        Защищенный метод. Кодирует строки в CSV прежнего формата
+        (cp1251, ';'). Значения, которых нет в cp1251, не заменяются:
+        в лог пишутся колонка, значение и аккаунты с ним,
+        затем UnicodeEncodeError пробрасывается дальше.
+        """
+        text = df.to_csv(index=False, header=header, sep=';')
+        try:
+            return text.encode('cp1251')
+        except UnicodeEncodeError:
+            text_columns = [
+                column for column in df.columns
+                if df[column].dtype == object
+                or isinstance(df[column].dtype, pd.CategoricalDtype)
+            ]
+            for column in text_columns:
+                for value in df[column].dropna().unique():
+                    try:
+                        str(value).encode('cp1251')
+                        continue
+                    except UnicodeEncodeError:
+                        pass
+                    accounts = df.loc[
+                        df[column] == value, ACCOUNT_COLUMN
+                    ].unique() if ACCOUNT_COLUMN in df else []
+                    logging.error(
+                        f'Значение колонки {column} не записывается '
+                        f'в cp1251: {value!r}, аккаунты: '
+                        f'{", ".join(map(str, accounts))}'
+                    )
+            raise
+
+    def export_csv(self, path: Path, dates: list[str] | None = None) -> None:
+        """
+        Выгружает историю в CSV в прежнем формате (cp1251, ';',
+        расход в рублях с НДС), записывая историю по месяцам.
+        Все месяцы приводятся к общему списку колонок columns(): строки
+        профиля без части колонок пишутся с пустыми значениями в них.
+        Файл пишется через atomic_open: в памяти не больше одного
+        месяца, а при сбое прежний CSV остается целым.
+
+        Смещение начала каждого месяца в файле сохраняется
+        в CSV_INDEX_FILE. Если переданы dates - все даты, изменившиеся
+        с прошлой выгрузки, - и CSV с нее не менялся, начало файла
+        до месяца первой из них копируется из прежнего CSV побайтно,
+        а заново выгружаются только месяцы с этой даты. Время выгрузки
+        тогда зависит от окна обновления, а не от глубины истории.
+        Иначе (и если в новых месяцах появились колонки) выгружается
+        вся история. Значение, которого нет в cp1251, прерывает
+        выгрузку с UnicodeEncodeError (см. _encode_csv): прежний
+        CSV остается как был, а следующая выгрузка будет полной.
+        """
+        path = Path(path)
+        months: dict[str, list[str]] = {}
+        for date in self.dates():
+            months.setdefault(date[:7], []).append(date)
+        index = None
+        if dates is not None:
+            index = self._load_csv_index(path)
+        if index is not None and not dates:
+            logging.info(f'Изменений нет, {path} не перезаписан')
+            return
+
+        offsets: dict[str, int] = {}
+        head_size = 0
+        if index is not None:
+            start = min(dates)[:7]
+            offsets = {
+                month: offset for month, offset in index['months'].items()
+                if month < start
+            }
+            head_size = next(
+                (
+                    offset for month, offset in index['months'].items()
+                    if month >= start
+                ),
+                index['size']
+            )
+            tail = [
+                date for month, month_dates in months.items()
+                if month >= start for date in month_dates
+            ]
+            if list(offsets) != [
+                month for month in months if month < start
+            ] or not set(self.columns(tail)) <= set(index['columns']):
+                index = None
+        if index is None:
+            offsets = {}
+            head_size = 0
+            columns = self.columns()
+        else:
+            columns = index['columns']
+        kept = len(offsets)
+
+        # Без индекса следующая выгрузка будет полной, если эта сорвется.
+        (self.root / CSV_INDEX_FILE).unlink(missing_ok=True)
+        with atomic_open(path, 'wb') as file:
+            if head_size:
+                self._copy_head(path, file, head_size)
+            elif columns:
+                file.write(self._encode_csv(
+                    pd.DataFrame(columns=columns), header=True
+                ))
+            for month, month_dates in months.items():
+                if month in offsets:
+                    continue
+                offsets[month] = file.tell()
+                part = self._read_partitions(month_dates)
+                file.write(self._encode_csv(
+                    to_output(part.reindex(columns=columns)), header=False
+                ))
+        stat = path.stat()
+        with atomic_open(
+            self.root / CSV_INDEX_FILE, 'w', encoding='utf-8'
+        ) as file:
+            json.dump(
+                {
+                    'file': path.name,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'columns': columns,
+                    'months': offsets
+                },
+                file,
+                ensure_ascii=False
+            )
+        logging.info(
+            f'История выгружена в {path}, '
+            f'переписано месяцев: {len(months) - kept} из {len(months)}'
+        )
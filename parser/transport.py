@@ -0,0 +1,110 @@
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from parser.constants import (
+    HTTP_BACKOFF_FACTOR,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_RETRIES,
+    HTTP_RETRY_STATUSES,
+    MAX_WORKERS
+)
+
+
+class DirectTransport:
+    """
+    Общий HTTP-транспорт для запросов к API Яндекс.Директ.
+
+    Держит одну requests.Session с пулом keep-alive соединений
+    размером с число потоков выгрузки, запрашивает сжатие gzip,
+    задает таймауты и повторяет запросы при ошибках соединения
+    и ответах HTTP_RETRY_STATUSES с экспоненциальной паузой.
+    Считает запросы, новые соединения и байты, пришедшие по сети.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = MAX_WORKERS,
+        retries: int = HTTP_RETRIES,
+        backoff_factor: float = HTTP_BACKOFF_FACTOR,
+        timeout: tuple[float, float] = (
+            HTTP_CONNECT_TIMEOUT,
+            HTTP_READ_TIMEOUT
+        )
+    ):
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=HTTP_RETRY_STATUSES,
+            allowed_methods=None,
+            raise_on_status=False
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, pool_size),
+            max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount('https://', self._adapter)
+        self.session.mount('http://', self._adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip'
+        self._lock = threading.Lock()
+        self.requests_count = 0
+        self.wire_bytes = 0
+        self.body_bytes = 0
+
+    def post(
+        self,
+        url: str,
+        data: str,
+        headers: dict
+    ) -> requests.Response:
+        """Отправляет POST-запрос через общий пул соединений."""
+        response = self.session.post(
+            url,
+            data=data,
+            headers=headers,
+            timeout=self.timeout
+        )
+        with self._lock:
+            self.requests_count += 1
+            self.wire_bytes += response.raw.tell()
+            self.body_bytes += len(response.content)
+        return response
+
+    @property
+    def connections_count(self) -> int:
+        """Количество TCP/TLS соединений, открытых за время работы."""
+        pools = self._adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def get_stats(self) -> dict[str, int]:
+        """Возвращает счетчики транспорта."""
+        connections = self.connections_count
+        return {
+            'requests': self.requests_count,
+            'connections': connections,
+            'reused': max(0, self.requests_count - connections),
+            'wire_bytes': self.wire_bytes,
+            'body_bytes': self.body_bytes
+        }
+
+    def log_stats(self) -> None:
+        """Логирует счетчики транспорта."""
+        stats = self.get_stats()
+        logging.info(
+            f'HTTP: запросов - {stats["requests"]}, '
+            f'новых соединений - {stats["connections"]}, '
+            f'переиспользовано - {stats["reused"]}, '
+            f'получено по сети - {stats["wire_bytes"]} байт, '
+            f'после распаковки - {stats["body_bytes"]} байт'
+        )
+
+    def close(self) -> None:
+        """Закрывает соединения пула."""
+        self.session.close()
@@ -1,14 +1,104 @@
 import datetime as dt
+import hashlib
+import sys
+from pathlib import Path
 
 from parser.constants import DATE_FORMAT, DAYS_TO_GENERATE
 
 
-def get_date_list() -> list[str]:
+def get_date_list(days: int = DAYS_TO_GENERATE) -> list[str]:
     """Функция генерирует список дат за указанное количество дней."""
     dates_list = []
-    for i in range(DAYS_TO_GENERATE, 0, -1):
+    for i in range(days, 0, -1):
         tempday = dt.datetime.now()
         tempday -= dt.timedelta(days=i)
         tempday_str = tempday.strftime(DATE_FORMAT)
         dates_list.append(tempday_str)
     return dates_list
+
+
+def get_peak_memory_mb() -> float | None:
+    """
+    Функция возвращает пиковый объем памяти процесса (RSS) в мегабайтах.
+    На платформах без модуля resource возвращает None.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return round(peak / 1024, 2)
+
+
+def get_refresh_dates(
+    dates_list: list[str],
+    watermark: str | None,
+    volatile_days: int
+) -> list[str]:
+    """
+    Функция выбирает даты для инкрементальной выгрузки логина.
+
+    Возвращает последние volatile_days дат окна (статистика за них
+    еще может измениться) и все даты после водяного знака (пропуски).
+    Без водяного знака возвращает окно целиком.
+    """
+    if watermark is None:
+        return list(dates_list)
+    volatile = dates_list[-volatile_days:] if volatile_days > 0 else []
+    return [
+        date for date in dates_list
+        if date > watermark or date in volatile
+    ]
+
+
+def get_settled_date(date_to: str, volatile_days: int) -> str:
+    """
+    Функция возвращает последнюю устоявшуюся дату в выгрузке,
+    заканчивающейся на date_to.
+    """
+    settled = dt.datetime.strptime(date_to, DATE_FORMAT)
+    settled -= dt.timedelta(days=volatile_days)
+    return settled.strftime(DATE_FORMAT)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """
+    Функция разбирает номер шарда вида i/N (1 <= i <= N).
+    При неверном формате вызывает ValueError.
+    """
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f'шард должен иметь вид i/N, получено: {value}')
+    if not 1 <= index <= count:
+        raise ValueError(f'номер шарда вне диапазона 1..{count}: {value}')
+    return index, count
+
+
+def get_shard_logins(logins: list[str], index: int, count: int) -> list[str]:
+    """
+    Функция отбирает логины шарда index из count.
+    Логин попадает в шард по md5 своего имени, поэтому разбиение
+    одинаково на всех машинах и не зависит от порядка списка.
+    """
+    return [
+        login for login in logins
+        if int(hashlib.md5(login.encode('utf-8')).hexdigest(), 16)
+        % count == index - 1
+    ]
+
+
+def get_shard_filename(
+    filename: str,
+    shard: tuple[int, int] | None
+) -> str:
+    """
+    Функция добавляет к имени файла номер шарда:
+    eapteka_direct.csv -> eapteka_direct.shard-1-of-4.csv.
+    """
+    if shard is None:
+        return filename
+    path = Path(filename)
+    return f'{path.stem}.shard-{shard[0]}-of-{shard[1]}{path.suffix}'
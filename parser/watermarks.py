@@ -0,0 +1,62 @@
+import datetime as dt
+import json
+import logging
+from pathlib import Path
+
+from parser.constants import DATE_FORMAT
+from parser.writer import atomic_open
+
+
+class WatermarkStore:
+    """
+    Водяные знаки инкрементальной выгрузки.
+
+    Для каждого логина хранится последняя дата, статистика за которую
+    была выгружена уже устоявшейся. Также хранится дата последней
+    полной перевыгрузки окна. Данные лежат в JSON-файле.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._data = self._load()
+
+    def _load(self) -> dict:
+        """Защищенный метод. Загружает водяные знаки с диска."""
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {'logins': {}, 'last_full_refresh': None}
+        except (OSError, ValueError) as e:
+            logging.warning(f'Водяные знаки не прочитаны: {e}')
+            return {'logins': {}, 'last_full_refresh': None}
+
+    def get(self, login: str) -> str | None:
+        """Возвращает водяной знак логина или None."""
+        return self._data['logins'].get(login)
+
+    def set(self, login: str, date: str) -> None:
+        """Сдвигает водяной знак логина вперед (назад не сдвигает)."""
+        current = self.get(login)
+        if current is None or date > current:
+            self._data['logins'][login] = date
+
+    def needs_full_refresh(self, interval_days: int) -> bool:
+        """Проверяет, пора ли перевыгрузить окно целиком."""
+        last = self._data.get('last_full_refresh')
+        if last is None:
+            return True
+        last_date = dt.datetime.strptime(last, DATE_FORMAT).date()
+        return (dt.date.today() - last_date).days >= interval_days
+
+    def mark_full_refresh(self) -> None:
+        """Отмечает, что окно перевыгружено целиком сегодня."""
+        self._data['last_full_refresh'] = dt.date.today().strftime(
+            DATE_FORMAT
+        )
+
+    def save(self) -> None:
+        """Атомарно сохраняет водяные знаки."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with atomic_open(self.path, 'w', encoding='utf-8') as file:
+            json.dump(self._data, file, ensure_ascii=False, indent=4)
@@ -0,0 +1,45 @@
+import logging
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Iterator
+
+
+def _fsync_dir(path: Path) -> None:
+    """Функция сбрасывает на диск запись каталога (где это возможно)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path: Path, mode: str = 'w', **kwargs) -> Iterator[IO]:
+    """
+    Контекстный менеджер атомарной записи файла.
+
+    Данные пишутся во временный файл рядом с целевым, после успешной
+    записи сбрасываются на диск (fsync) и одним os.replace подменяют
+    целевой файл. Читатели видят либо старый файл, либо новый целиком.
+    При ошибке временный файл удаляется, целевой не меняется.
+    Аргументы kwargs передаются в open.
+    """
+    path = Path(path)
+    temp_path = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    try:
+        with open(temp_path, mode, **kwargs) as file:
+            yield file
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        logging.error(f'Запись {path} прервана, файл не изменен')
+        raise
+    _fsync_dir(path.parent)
@@ -1,23 +1,64 @@
+import io
 import json
 import logging
+import threading
 import time
-from typing import Any
+from contextlib import contextmanager
+from typing import Any, Iterator
 from pathlib import Path
 
 from dotenv import load_dotenv
 import pandas as pd
 import requests
 
+from parser.classifier import CampaignClassifier
+from parser.collector import BatchCollector
 from parser.constants import (
-    CAMPAIGN_CATEGORIES,
+    ACCOUNT_COLUMN,
+    CHANGES_FILE,
+    CLASSIFIER_CACHE_FILE,
+    COLLECT_FLUSH_BYTES,
     DEFAULT_FOLDER,
-    DEFAULT_RETURNES,
-    PLATFORM_TYPES,
+    FULL_REFRESH_INTERVAL_DAYS,
+    HISTORY_FOLDER,
+    JOURNAL_FILE,
+    LOGIN_STATS_FILE,
+    MAX_REPORTS_IN_QUEUE,
+    MAX_WORKERS,
+    METRICS_FILE,
+    METRICS_PROM_FILE,
+    RATE_LIMIT_PAUSE,
+    REPORT_CACHE_FOLDER,
+    REPORT_DTYPES,
     REPORT_FIELDS,
     REPORT_NAME,
+    REPORT_REQUIRED_FIELDS,
+    REPORT_RESPONSE_HEADERS,
+    ROLLUP_FOLDER,
+    ROLLUP_LEVELS,
+    VOLATILE_DAYS,
+    WATERMARKS_FILE,
     YANDEX_DIRECT_URL
 )
+from parser.decorators import time_of_stage
+from parser.journal import RunJournal
 from parser.logging_config import setup_logging
+from parser.metrics import RunMetrics
+from parser.pipeline import Pipeline
+from parser.rate_limiter import AdaptiveRateLimiter
+from parser.report_cache import ReportCache
+from parser.rollups import RollupStore
+from parser.scheduler import ReportScheduler, ReportTask
+from parser.schema import concat_frames, from_output, to_compact
+from parser.stats import LoginStatsStore
+from parser.storage import PartitionedStore
+from parser.transport import DirectTransport
+from parser.utils import (
+    get_refresh_dates,
+    get_settled_date,
+    get_shard_filename
+)
+from parser.watermarks import WatermarkStore
 
 load_dotenv()
 setup_logging()
@@ -31,14 +72,71 @@ class DirectSaveClient:
         token: str,
         dates_list: list,
         login: list,
-        folder_name: str = DEFAULT_FOLDER
+        folder_name: str = DEFAULT_FOLDER,
+        max_workers: int = MAX_WORKERS,
+        debug_dump: bool = False,
+        incremental: bool = False,
+        force_full: bool = False,
+        volatile_days: int = VOLATILE_DAYS,
+        transport: DirectTransport | None = None,
+        rate_limiter: AdaptiveRateLimiter | None = None,
+        use_report_cache: bool = True,
+        api_url: str = YANDEX_DIRECT_URL,
+        metrics: RunMetrics | None = None,
+        shard: tuple[int, int] | None = None,
+        report_fields: tuple[str, ...] = REPORT_FIELDS,
+        flush_bytes: int = COLLECT_FLUSH_BYTES
     ):
         if not token:
             logging.error('Токен отсутствует или не действителен')
+        missing = set(REPORT_REQUIRED_FIELDS) - set(report_fields)
+        if missing:
+            raise ValueError(
+                f'В полях отчета нет обязательных: {sorted(missing)}'
+            )
         self.token = token
         self.logins = login
         self.dates_list = dates_list
         self.folder = folder_name
+        self.api_url = api_url
+        self.max_workers = max(1, max_workers)
+        self.debug_dump = debug_dump
+        self.incremental = incremental
+        self.force_full = force_full
+        self.volatile_days = volatile_days
+        self.transport = transport or DirectTransport(self.max_workers)
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.metrics = metrics or RunMetrics()
+        self.shard = shard
+        self.report_fields = tuple(report_fields)
+        self.flush_bytes = flush_bytes
+        self.report_cache = None
+        if use_report_cache:
+            self.report_cache = ReportCache(
+                self._get_file_path(REPORT_CACHE_FOLDER),
+                volatile_days=volatile_days
+            )
+        self.fetched_logins: list[str] = []
+        self._collector = BatchCollector()
+        self._collected_logins: list[str] = []
+        self._temp_cache_path: Path | None = None
+        self._login_tasks: dict[str, list[ReportTask]] = {}
+        self._emitted: set[str] = set()
+        self._unprocessed: set[str] = set()
+        self._lock = threading.Lock()
+        self._pipeline: Pipeline | None = None
+        self._filename_data: str | None = None
+        self._store: PartitionedStore | None = None
+        self._watermarks: WatermarkStore | None = None
+        self._date_ranges: dict[str, list[str]] = {}
+        self._full_refresh = False
+        self.journal: RunJournal | None = None
+        self.login_stats = LoginStatsStore(
+            self._get_file_path(LOGIN_STATS_FILE)
+        )
+        self.classifier = CampaignClassifier(
+            self._get_file_path(CLASSIFIER_CACHE_FILE)
+        )
 
     def _decode_if_bytes(self, x: Any) -> Any:
         """
@@ -60,31 +158,15 @@ class DirectSaveClient:
             logging.error(f'Ошибка: {e}')
             raise
 
-    def _get_direct_report(
-        self,
-        login: str,
-        date_from: str,
-        date_to: str
-    ) -> str:
-        """
-        Защищенный метод.
-        Получает отчет из Яндекс.Директ для указанного логина и периода.
-        """
-
-        headers = {
-            "Authorization": "Bearer " + self.token,
-            "Client-Login": login,
-            "Accept-Language": "ru",
-            "processingMode": "auto"
-        }
-
+    def _get_report_body(self, date_from: str, date_to: str) -> str:
+        """Защищенный метод. Формирует JSON-тело запроса отчета."""
         body = {
             "params": {
                 "SelectionCriteria": {
                     "DateFrom": date_from,
                     "DateTo": date_to
                 },
-                "FieldNames": REPORT_FIELDS[0],
+                "FieldNames": list(self.report_fields),
                 "ReportName": REPORT_NAME,
                 "ReportType": "CUSTOM_REPORT",
                 "DateRangeType": "CUSTOM_DATE",
@@ -93,171 +175,555 @@ class DirectSaveClient:
                 "IncludeDiscount": "NO"
             }
         }
+        return json.dumps(body, indent=4)
 
-        body = json.dumps(body, indent=4)
+    def _log_api_error(
+        self,
+        message: str,
+        response: requests.Response,
+        body: str | None = None
+    ) -> None:
+        """Защищенный метод. Логирует ошибку API с RequestId и ответом."""
+        request_id = response.headers.get('RequestId', None)
+        request_json = ''
+        if body is not None:
+            request_json = f'JSON-код запроса: {self._decode_if_bytes(body)}\n'
+        logging.error(
+            f'{message}\n'
+            f'RequestId: {request_id}\n'
+            f'{request_json}'
+            'JSON-код ответа сервера: '
+            f'{self._decode_if_bytes(response.json())}'
+        )
 
-        while True:
-            try:
-                response = requests.post(
-                    YANDEX_DIRECT_URL,
+    def request_report(self, task: ReportTask) -> tuple[str, int, Any]:
+        """
+        Метод отправляет один запрос отчета (постановка в очередь
+        или опрос) - функция запроса для ReportScheduler.
+        Возвращает кортеж (состояние, retryIn, тело отчета в байтах).
+        """
+        headers = {
+            "Authorization": "Bearer " + self.token,
+            "Client-Login": task.login,
+            "Accept-Language": "ru",
+            "processingMode": "auto",
+            **REPORT_RESPONSE_HEADERS
+        }
+        body = self._get_report_body(task.date_from, task.date_to)
+
+        try:
+            self.rate_limiter.acquire()
+            with self.metrics.timer('download', task.login):
+                response = self.transport.post(
+                    self.api_url,
                     body,
                     headers=headers
                 )
-                response.encoding = 'utf-8'
-
-                if response.status_code == requests.codes.bad_request:
-
-                    logging.error(
-                        'Параметры запроса указаны неверно или достигнут '
-                        'лимит отчетов в очереди\n'
-                        'RequestId: '
-                        f'{response.headers.get('RequestId', None)}\n'
-                        f'JSON-код запроса: {self._decode_if_bytes(body)}\n'
-                        'JSON-код ответа сервера: '
-                        f'{self._decode_if_bytes(response.json())}'
-                    )
-                    break
-                elif response.status_code == requests.codes.ok:
-                    logging.info('Ответ успешно получен')
-                    break
-                elif response.status_code == requests.codes.created:
-                    retryIn = int(response.headers.get('retryIn', 60))
-                    logging.warning('Отчет еще создается')
-                    time.sleep(retryIn)
-                elif response.status_code == requests.codes.accepted:
-                    retryIn = int(response.headers.get('retryIn', 60))
-                    logging.warning('Отчет еще создается')
-                    time.sleep(retryIn)
-                elif response.status_code == \
-                        requests.codes.internal_server_error:
-                    logging.error(
-                        'Ошибка. Повторить запрос позднее.\n'
-                        'RequestId: '
-                        f'{response.headers.get('RequestId', None)}\n'
-                        'JSON-код ответа сервера: '
-                        f'{self._decode_if_bytes(response.json())}'
-                    )
-                    break
-                elif response.status_code == requests.codes.bad_gateway:
-                    logging.error(
-                        'Время формирования отчета превышено. '
-                        'Изменить параметры запроса.\n'
-                        'RequestId: '
-                        f'{response.headers.get('RequestId', None)}\n'
-                        f'JSON-код запроса: {self._decode_if_bytes(body)}\n'
-                        'JSON-код ответа сервера: '
-                        f'{self._decode_if_bytes(response.json())}'
-                    )
-                    break
-                else:
-                    logging.error(
-                        'Произошла непредвиденная ошибка.\n'
-                        'RequestId: '
-                        f'{response.headers.get('RequestId', None)}\n'
-                        f'JSON-код запроса: {self._decode_if_bytes(body)}\n'
-                        'JSON-код ответа сервера: '
-                        f'{self._decode_if_bytes(response.json())}'
+            self.metrics.incr('requests', login=task.login)
+            self.rate_limiter.on_response(response)
+
+            if self.rate_limiter.is_throttled(response):
+                logging.warning(
+                    f'Ограничение API для аккаунта {task.login}, '
+                    'отчет будет запрошен повторно'
+                )
+                return 'throttled', RATE_LIMIT_PAUSE, None
+            elif response.status_code == requests.codes.bad_request:
+                self._log_api_error(
+                    'Параметры запроса указаны неверно или достигнут '
+                    'лимит отчетов в очереди',
+                    response,
+                    body
+                )
+            elif response.status_code == requests.codes.ok:
+                logging.info(f'Ответ успешно получен, аккаунт: {task.login}')
+                build_seconds = time.monotonic() - task.queued_at
+                self.metrics.add_time('queue_wait', build_seconds, task.login)
+                self.login_stats.record_build(
+                    task.login, task.days, build_seconds, task.polls + 1
+                )
+                self.metrics.incr(
+                    'download_bytes', len(response.content), task.login
+                )
+                if self.report_cache is not None:
+                    self.report_cache.put(
+                        self.report_cache.make_key(
+                            task.login, body, REPORT_RESPONSE_HEADERS
+                        ),
+                        response.content
                     )
-                    break
+                return 'ready', 0, response.content
+            elif response.status_code in (
+                requests.codes.created,
+                requests.codes.accepted
+            ):
+                retry_in = int(response.headers.get('retryIn', 60))
+                logging.warning(
+                    f'Отчет еще создается, аккаунт: {task.login}'
+                )
+                if task.polls == 0:
+                    self._set_journal_state([task.login], 'queued')
+                return 'building', retry_in, None
+            elif response.status_code == \
+                    requests.codes.internal_server_error:
+                self._log_api_error(
+                    'Ошибка. Повторить запрос позднее.',
+                    response
+                )
+            elif response.status_code == requests.codes.bad_gateway:
+                self._log_api_error(
+                    'Время формирования отчета превышено. '
+                    'Период отчета будет уменьшен.',
+                    response,
+                    body
+                )
+                self.login_stats.record_timeout(task.login, task.days)
+                return 'too_large', 0, None
+            else:
+                self._log_api_error(
+                    'Произошла непредвиденная ошибка.',
+                    response,
+                    body
+                )
+
+        except requests.exceptions.ConnectionError:
+            logging.error('Произошла ошибка соединения с сервером API')
 
-            except requests.exceptions.ConnectionError:
-                logging.error('Произошла ошибка соединения с сервером API')
-                break
+        except Exception as e:
+            logging.error(f'ошибка: {e}')
+
+        return 'failed', 0, None
 
-            except Exception as e:
-                logging.error(f'ошибка: {e}')
-                break
+    def _set_journal_state(self, logins: list[str], state: str) -> None:
+        """Защищенный метод. Записывает состояние логинов в журнал."""
+        if self.journal is not None and logins:
+            self.journal.set_states(logins, state)
 
-        return response.text
+    def _load_cached_report(self, task: ReportTask) -> bool:
+        """
+        Защищенный метод. Берет отчет задачи из кэша сырых ответов.
+        Возвращает True, если отчет найден и запрос к API не нужен.
+        """
+        if self.report_cache is None:
+            return False
+        data = self.report_cache.get(
+            self.report_cache.make_key(
+                task.login,
+                self._get_report_body(task.date_from, task.date_to),
+                REPORT_RESPONSE_HEADERS
+            ),
+            task.date_to
+        )
+        if data is None:
+            return False
+        self.metrics.incr('cache_hits', login=task.login)
+        task.status = 'done'
+        task.result = data
+        return True
+
+    def _parse_report(self, data: bytes, login: str) -> pd.DataFrame:
+        """
+        Защищенный метод. Разбирает TSV-отчет прямо из буфера в памяти,
+        без промежуточного файла и декодирования всего текста.
+        API присылает только строки данных (REPORT_RESPONSE_HEADERS),
+        поэтому колонки берутся из полей запроса, а фильтровать
+        название и итог не нужно. Колонки приводятся к REPORT_SCHEMA.
+        Пустой ответ означает, что строк за период нет.
+        """
+        if not data.strip():
+            return pd.DataFrame()
+        df = pd.read_csv(
+            io.BytesIO(data),
+            sep='\t',
+            encoding='utf-8',
+            header=None,
+            names=list(self.report_fields),
+            dtype=REPORT_DTYPES
+        )
+        df[ACCOUNT_COLUMN] = login
+        return to_compact(df)
 
-    def _get_platform_type(self, row) -> str:
+    def _get_date_ranges(
+        self,
+        watermarks: WatermarkStore,
+        logins: list[str]
+    ) -> tuple[dict[str, list[str]], bool]:
+        """
+        Защищенный метод. Определяет даты выгрузки для каждого логина.
+        Возвращает словарь {логин: даты} и признак полной выгрузки.
+        """
+        full_refresh = (
+            not self.incremental
+            or self.force_full
+            or watermarks.needs_full_refresh(FULL_REFRESH_INTERVAL_DAYS)
+        )
+        if full_refresh:
+            date_ranges = {login: self.dates_list for login in logins}
+            return date_ranges, True
+
+        date_ranges = {
+            login: get_refresh_dates(
+                self.dates_list,
+                watermarks.get(login),
+                self.volatile_days
+            )
+            for login in logins
+        }
+        logging.info(
+            'Инкрементальная выгрузка: '
+            f'{sum(len(dates) for dates in date_ranges.values())} '
+            f'логино-дней из {len(logins) * len(self.dates_list)}'
+        )
+        return date_ranges, False
+
+    def _skip_dormant_logins(
+        self,
+        date_ranges: dict[str, list[str]]
+    ) -> dict[str, list[str]]:
+        """
+        Защищенный метод. Убирает из выгрузки спящие логины, которые
+        опрашивались меньше DORMANT_POLL_INTERVAL_DAYS дней назад.
+        Их водяной знак не сдвигается, поэтому пропущенные дни
+        выгрузятся при следующем опросе или полной выгрузке.
+        """
+        skipped = [
+            login for login in date_ranges
+            if not self.login_stats.needs_poll(login)
+        ]
+        if not skipped:
+            return date_ranges
+        logging.info(f'Спящие логины пропущены: {", ".join(skipped)}')
+        self.metrics.incr('dormant_skipped', len(skipped))
+        self._set_journal_state(skipped, 'skipped')
+        return {
+            login: dates for login, dates in date_ranges.items()
+            if login not in skipped
+        }
+
+    def _update_watermarks(
+        self,
+        watermarks: WatermarkStore,
+        date_ranges: dict[str, list[str]],
+        logins: list[str]
+    ) -> None:
+        """Защищенный метод. Сдвигает водяные знаки записанных логинов."""
+        for login in logins:
+            watermarks.set(
+                login,
+                get_settled_date(date_ranges[login][-1], self.volatile_days)
+            )
+        watermarks.save()
+
+    def _plan_report_tasks(
+        self,
+        login: str,
+        dates: list[str]
+    ) -> list[ReportTask]:
+        """
+        Защищенный метод. Режет даты логина на периоды отдельных
+        отчетов по накопленной статистике размера и ответов 502.
+        """
+        chunk_days = self.login_stats.get_chunk_days(login, len(dates))
+        return [
+            ReportTask(
+                login,
+                dates[start],
+                dates[min(start + chunk_days, len(dates)) - 1],
+                owner=self
+            )
+            for start in range(0, len(dates), chunk_days)
+        ]
+
+    def _emit_login(self, login: str) -> None:
+        """
+        Защищенный метод. Передает отчеты логина в конвейер обработки,
+        как только получены все его части.
+        """
+        leaves = [
+            leaf for task in self._login_tasks[login]
+            for leaf in task.leaves()
+        ]
+        if any(leaf.status != 'done' for leaf in leaves):
+            return
+        with self._lock:
+            if login in self._emitted:
+                return
+            self._emitted.add(login)
+        self._set_journal_state([login], 'fetched')
+        self._pipeline.put((login, leaves))
+
+    def finish_task(self, task: ReportTask) -> None:
+        """
+        Метод вызывается планировщиком, когда задача клиента
+        выполнена или не удалась: логин, все отчеты которого
+        получены, уходит в конвейер обработки.
+        """
+        self._emit_login(task.login)
+
+    def _parse_login_reports(
+        self,
+        item: tuple[str, list[ReportTask]]
+    ) -> tuple[str, pd.DataFrame] | None:
+        """
+        Защищенный метод. Этап разбора: склеивает TSV-отчеты частей
+        периода логина в один DataFrame.
+        """
+        login, leaves = item
         try:
-            for tag, value in PLATFORM_TYPES.items():
-                if tag in row['CampaignName']:
-                    return value
-            else:
-                return DEFAULT_RETURNES.get('platform', '')
-        except (AttributeError, IndexError, KeyError):
-            return DEFAULT_RETURNES.get('error', '')
+            if self.debug_dump:
+                with open(self._temp_cache_path, 'wb') as file:
+                    for leaf in leaves:
+                        file.write(leaf.result)
+            frames = []
+            for leaf in leaves:
+                self.login_stats.record_report(
+                    login, leaf.days, len(leaf.result)
+                )
+                with self.metrics.timer('parse', login):
+                    frames.append(self._parse_report(leaf.result, login))
+                leaf.result = None
+            df = concat_frames(frames)
+            self.login_stats.record_rows(
+                login, sum(leaf.days for leaf in leaves), len(df)
+            )
+            self.metrics.incr('parsed_rows', len(df), login)
+            return login, df
+        except Exception as e:
+            logging.error(f'ошибка разбора отчета аккаунта {login}: {e}')
+            self._mark_unprocessed(login)
+            return None
 
-    def _get_campaign_category(self, row) -> str:
+    def _classify_login(
+        self,
+        item: tuple[str, pd.DataFrame]
+    ) -> tuple[str, pd.DataFrame] | None:
+        """Защищенный метод. Этап классификации строк логина."""
+        login, df = item
         try:
-            for tag, value in CAMPAIGN_CATEGORIES.items():
-                if tag in row['CampaignName']:
-                    return value
-            return DEFAULT_RETURNES.get('campaign', '')
-        except (AttributeError, IndexError, KeyError):
-            return DEFAULT_RETURNES.get('error', '')
+            if not df.empty:
+                df = self._enrich_report_data(df)
+            return login, df
+        except Exception as e:
+            logging.error(f'ошибка классификации аккаунта {login}: {e}')
+            self._mark_unprocessed(login)
+            return None
+
+    def _mark_unprocessed(self, login: str) -> None:
+        """
+        Защищенный метод. Отмечает логин, отчеты которого получены,
+        но не обработаны: take_unprocessed_tasks вернет их
+        для повторной выгрузки.
+        """
+        self._set_journal_state([login], 'failed')
+        with self._lock:
+            self._unprocessed.add(login)
+            self._emitted.discard(login)
+
+    def take_unprocessed_tasks(self) -> list[ReportTask]:
+        """
+        Метод дожидается конвейера обработки и возвращает конечные
+        задачи логинов, которые не удалось разобрать
+        или классифицировать, - для collect_failed планировщика.
+        Повтор выгружает их отчеты заново.
+        """
+        if self._pipeline is None:
+            return []
+        self._pipeline.join()
+        with self._lock:
+            logins = sorted(self._unprocessed)
+            self._unprocessed.clear()
+        return [
+            leaf for login in logins
+            for task in self._login_tasks[login]
+            for leaf in task.leaves()
+        ]
 
-    def _get_all_direct_data(self, filename_temp) -> pd.DataFrame:
+    def _collect_login(self, item: tuple[str, pd.DataFrame]) -> None:
+        """
+        Защищенный метод. Приемник: складывает строки логина и,
+        когда их набирается flush_bytes, записывает накопленное
+        в хранилище, открытое begin_save.
+        """
+        login, df = item
+        self._collector.add(df)
+        self.fetched_logins.append(login)
+        self._collected_logins.append(login)
+        self._set_journal_state([login], 'parsed')
+        if (
+            self._store is not None
+            and self._collector.buffered_bytes >= self.flush_bytes
+        ):
+            self.metrics.incr('flushes')
+            self._write_logins(self.get_fetched_data())
+
+    def _write_logins(self, df: pd.DataFrame) -> None:
+        """
+        Защищенный метод. Записывает строки логинов, собранных
+        с прошлой записи: изменившиеся пары (дата, логин) - в хранилище,
+        затем водяные знаки и журнал. Измененные даты копятся в журнале
+        до выгрузки CSV и агрегатов в end_save.
+        """
+        logins, self._collected_logins = self._collected_logins, []
+        if not logins:
+            return
+        with self.metrics.timer('merge'):
+            changed = self._store.upsert(
+                df, {login: self._date_ranges[login] for login in logins}
+            )
+        self._save_changes(self._store, changed)
+        self.journal.add_dates(sorted({date for date, _ in changed}))
+        self._update_watermarks(self._watermarks, self._date_ranges, logins)
+        self.journal.set_states(logins, 'written')
+
+    @contextmanager
+    def fetch_session(
+        self,
+        filename_temp: str,
+        date_ranges: dict[str, list[str]] | None = None
+    ) -> Iterator[list[ReportTask]]:
+        """
+        Метод готовит выгрузку данных клиента и отдает задачи,
+        которые нужно выполнить планировщиком с request_report
+        и finish_task (задачи нескольких клиентов можно выполнять
+        одним планировщиком: клиент задачи - в ReportTask.owner).
+        Отчеты из кэша сразу уходят в конвейер обработки. Задачи
+        отсортированы по ожидаемому времени: самые долгие по статистике
+        прошлых запусков - первыми, чтобы крупный логин
+        не растягивал конец запуска.
+        При выходе дожидается конвейера, логирует неполученные логины
+        и сохраняет статистику и кэш классификации; строки, еще
+        не записанные приемником, - в self._collector.
+        date_ranges задает даты для каждого логина, по умолчанию
+        выгружается весь dates_list.
+        При debug_dump=True сырой ответ сохраняется в filename_temp.
+        """
+        self._collector = BatchCollector()
+        self.fetched_logins = []
+        self._collected_logins = []
+        self._temp_cache_path = self._get_file_path(filename_temp)
+        if date_ranges is None:
+            date_ranges = {login: self.dates_list for login in self.logins}
+        self._login_tasks = {
+            login: self._plan_report_tasks(login, dates)
+            for login, dates in date_ranges.items()
+            if dates
+        }
+        tasks = [
+            task for chunks in self._login_tasks.values() for task in chunks
+        ]
+        to_fetch = sorted(
+            (task for task in tasks if not self._load_cached_report(task)),
+            key=self.estimate_task_seconds,
+            reverse=True
+        )
+        logging.info(
+            f'Отчетов из кэша: {len(tasks) - len(to_fetch)}, '
+            f'постановка в очередь {len(to_fetch)} отчетов'
+        )
+        self._pipeline = Pipeline(
+            [
+                ('parse', self._parse_login_reports),
+                ('classify', self._classify_login),
+                ('collect', self._collect_login)
+            ],
+            metrics=self.metrics
+        )
+        self._emitted = set()
+        self._unprocessed = set()
+
+        with self._pipeline:
+            for login in self._login_tasks:
+                self._emit_login(login)
+            yield to_fetch
+
+        not_received = [
+            login for login in self._login_tasks
+            if login not in self._emitted and login not in self._unprocessed
+        ]
+        for login in not_received:
+            logging.error(f'ошибка: отчет для аккаунта {login} не получен')
+        self._set_journal_state(not_received, 'failed')
+
+        self.login_stats.save()
+        self.classifier.save_cache()
+        self._collector.log_stats()
+
+    def estimate_task_seconds(self, task: ReportTask) -> float:
+        """Метод возвращает ожидаемое время формирования отчета задачи."""
+        return self.login_stats.estimate_seconds(task.login, task.days)
+
+    @time_of_stage('fetch')
+    def _get_all_direct_data(
+        self,
+        filename_temp,
+        date_ranges: dict[str, list[str]] | None = None
+    ) -> pd.DataFrame:
         """
         Метод получает данные из Яндекс.Директ
         для всех клиентов и периодов.
+        Отчеты всех логинов сначала ставятся в очередь API,
+        затем опрашиваются планировщиком по мере готовности.
+        Период крупных логинов режется на части, которые выгружаются
+        параллельно и склеиваются; при ответе 502 часть делится дальше.
+        Готовые логины сразу уходят в конвейер разбор -> классификация
+        -> приемник, который работает параллельно со скачиванием.
+        Глубина очередей ограничивает число логинов, ждущих разбора
+        и классификации, а приемник после begin_save записывает строки
+        в хранилище каждые flush_bytes, поэтому память не растет
+        с объемом выгрузки.
+        Последний проход повторяет и логины, отчеты которых получены,
+        но не разобраны или не классифицированы.
         """
-        combined_data = pd.DataFrame()
-        current_index = 0
-        temp_cache_path = self._get_file_path(filename_temp)
+        scheduler = ReportScheduler(
+            self.request_report,
+            max_in_flight=MAX_REPORTS_IN_QUEUE,
+            max_workers=self.max_workers,
+            rate_limiter=self.rate_limiter
+        )
+        with self.fetch_session(filename_temp, date_ranges) as tasks:
+            scheduler.run_with_retries(
+                tasks,
+                self.finish_task,
+                collect_failed=self.take_unprocessed_tasks
+            )
+        self.transport.log_stats()
+        return self.get_fetched_data()
 
-        for current_index, login in enumerate(self.logins):
-            try:
-                logging.info(
-                    f'выгрузка №{current_index + 1}/{len(self.logins)}, '
-                    f'аккаунт: {login}'
-                )
-                data = self._get_direct_report(
-                    login,
-                    self.dates_list[0],
-                    self.dates_list[-1]
-                )
-                with open(temp_cache_path, 'w', encoding='utf-8') as file:
-                    file.write(data)
-                df = pd.read_csv(
-                    temp_cache_path,
-                    sep='	',
-                    encoding='cp1251',
-                    header=1
-                )
-                df['акаунт'] = login
-                combined_data = pd.concat([combined_data, df])
-                time.sleep(1)
-                current_index += 1
-            except Exception as e:
-                logging.error(f'ошибка: {e}')
-                current_index += 1
+    def get_fetched_data(self) -> pd.DataFrame:
+        """
+        Метод объединяет строки, собранные последней fetch_session
+        и еще не записанные приемником в хранилище.
+        """
+        return self._collector.materialize()
 
+    def _enrich_report_data(self, combined_data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Защищенный метод. Добавляет источник, тип площадки и категорию.
+        Расход остается в микроединицах без НДС до выгрузки в CSV.
+        """
+        self.metrics.incr('rows', len(combined_data))
         combined_data['источник'] = 'yandex'
-        combined_data['Cost'] = combined_data['Cost']*1.2/1000000
-        combined_data = combined_data[~combined_data['Date'].str.contains(
-            r'Total',
-            case=False,
-            na=False
-        )]
-        combined_data['поиск/сеть'] = combined_data.apply(
-            self._get_platform_type, axis=1)
-        combined_data['тип'] = combined_data.apply(
-            self._get_campaign_category, axis=1)
-        return combined_data
-
-    def _get_filtered_cache_data(self, filename_data: str) -> pd.DataFrame:
-        """Метод получает отфильтрованные данные из кэш-файла."""
+        with self.metrics.timer('classify'):
+            (
+                combined_data['поиск/сеть'],
+                combined_data['тип']
+            ) = self.classifier.classify_frame(combined_data)
+        return to_compact(combined_data)
+
+    def _read_cache_file(self, filename_data: str) -> pd.DataFrame:
+        """
+        Метод читает CSV-файл с историей целиком
+        в компактных типах REPORT_SCHEMA.
+        """
         temp_cache_path = self._get_file_path(filename_data)
         try:
-            old_df = pd.read_csv(
+            return from_output(pd.read_csv(
                 temp_cache_path,
                 sep=';',
                 encoding='cp1251',
-                header=0
-            )
-            for dates in self.dates_list:
-                old_df = old_df[
-                    ~old_df['Date'].fillna('').str.contains(
-                        fr'{dates}',
-                        case=False,
-                        na=False
-                    )
-                ]
-
-            return old_df
+                header=0,
+                dtype=REPORT_DTYPES
+            ))
         except FileNotFoundError:
             logging.warning('Файл кэша не найден. Первый запуск.')
             return pd.DataFrame()
@@ -268,42 +734,283 @@ class DirectSaveClient:
             logging.error(f'Ошибка: {e}')
             raise
 
-    def save_data(self, filename_temp: str, filename_data: str) -> None:
-        """Метод сохраняет новые данные, объединяя с существующими."""
-        df_new = self._get_all_direct_data(filename_temp)
-        df_old = self._get_filtered_cache_data(filename_data)
-        try:
-            temp_cache_path = self._get_file_path(filename_data)
-            if df_new.empty:
-                logging.warning('Нет новых данных для сохранения')
-                return
-            if not isinstance(df_old, pd.DataFrame) or df_old.empty:
-                df_new.to_csv(
-                    temp_cache_path,
-                    index=False,
-                    header=True,
-                    sep=';',
-                    encoding='cp1251'
-                )
+    def iter_data(
+        self,
+        filename_data: str,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        logins: list[str] | None = None,
+        categories: list[str] | None = None,
+        platforms: list[str] | None = None,
+        columns: list[str] | None = None
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Метод отдает пачками сохраненные строки filename_data
+        за диапазон дат (ГГГГ-ММ-ДД, включительно), отобранные
+        по логинам, категориям кампаний и типам площадок.
+        Читаются только партиции нужных дат и логинов; расход -
+        в микроединицах без НДС, как в хранилище (в рубли с НДС
+        переводит schema.to_output).
+        Хранилище открывается только для чтения: запрос ничего
+        не пишет на диск и может идти параллельно с save_data.
+        Пока история не перенесена в хранилище первой выгрузкой,
+        строк нет.
+        """
+        filename_data = get_shard_filename(filename_data, self.shard)
+        store = PartitionedStore(
+            self._get_store_root(filename_data), read_only=True
+        )
+        if store.is_empty():
+            logging.warning(
+                f'История {filename_data} еще не в хранилище, '
+                'запросы доступны после первой выгрузки'
+            )
+            return
+        yield from store.iter_query(
+            date_from, date_to, logins, categories, platforms, columns
+        )
+
+    def read_data(
+        self,
+        filename_data: str,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        logins: list[str] | None = None,
+        categories: list[str] | None = None,
+        platforms: list[str] | None = None,
+        columns: list[str] | None = None
+    ) -> pd.DataFrame:
+        """
+        Метод читает сохраненные строки filename_data одним
+        DataFrame. Условия - как у iter_data.
+        """
+        return concat_frames(list(self.iter_data(
+            filename_data,
+            date_from,
+            date_to,
+            logins,
+            categories,
+            platforms,
+            columns
+        )))
+
+    def _get_store_root(self, filename_data: str) -> Path:
+        """Защищенный метод. Возвращает папку хранилища файла данных."""
+        return self._get_file_path(HISTORY_FOLDER) / Path(filename_data).stem
+
+    def _get_store(self, filename_data: str) -> PartitionedStore:
+        """
+        Защищенный метод. Возвращает хранилище истории для файла данных.
+        При первом запуске переносит в него историю из CSV.
+        """
+        store = PartitionedStore(self._get_store_root(filename_data))
+        if store.is_empty():
+            df_old = self._read_cache_file(filename_data)
+            if not df_old.empty:
+                written = store.append(df_old)
                 logging.info(
-                    'Новые данные сохранены. Исторические данные отсутствовали'
+                    f'История из {filename_data} перенесена в хранилище, '
+                    f'партиций: {written}'
                 )
-                return
-            for dates in self.dates_list:
-                df_old = df_old[~df_old['Date'].fillna('').str.contains(
-                    fr'{dates}',
-                    case=False,
-                    na=False
-                )]
-
-            df_old = pd.concat([df_new, df_old])
-            df_old.to_csv(
-                temp_cache_path,
-                index=False,
-                header=True,
-                sep=';',
-                encoding='cp1251'
+        return store
+
+    def _update_rollups(
+        self,
+        store: PartitionedStore,
+        filename_data: str,
+        dates: list[str]
+    ) -> None:
+        """
+        Защищенный метод. Обновляет дневные и месячные агрегаты
+        за даты dates (при первом запуске - за всю историю)
+        и выгружает их в CSV рядом с файлом данных.
+        Без измененных дат выгруженные CSV не переписываются.
+        """
+        rollups = RollupStore(store.root / ROLLUP_FOLDER)
+        stem = Path(filename_data).stem
+        paths = {
+            level: self._get_file_path(f'{stem}_{level}.csv')
+            for level in ROLLUP_LEVELS
+        }
+        if rollups.is_empty():
+            dates = store.dates()
+        elif not dates and all(path.exists() for path in paths.values()):
+            return
+        rollups.update(store, dates)
+        for level, path in paths.items():
+            rollups.export_csv(level, path)
+
+    def begin_save(
+        self,
+        filename_data: str,
+        resume: bool = False
+    ) -> dict[str, list[str]]:
+        """
+        Метод готовит сохранение filename_data: открывает хранилище,
+        журнал и водяные знаки и возвращает даты выгрузки по логинам
+        для fetch_session. Данные записывают приемник fetch_session
+        (по мере накопления flush_bytes) и end_save.
+        """
+        self._filename_data = get_shard_filename(filename_data, self.shard)
+        with self.metrics.timer('load'):
+            self._store = self._get_store(self._filename_data)
+        self.journal = RunJournal(self._store.root / JOURNAL_FILE)
+        logins = self.journal.start(self.logins, resume)
+        self._watermarks = WatermarkStore(
+            self._store.root / WATERMARKS_FILE
+        )
+        self._date_ranges, self._full_refresh = self._get_date_ranges(
+            self._watermarks, logins
+        )
+        if not self._full_refresh:
+            self._date_ranges = self._skip_dormant_logins(self._date_ranges)
+        return self._date_ranges
+
+    def end_save(self, df_new: pd.DataFrame) -> None:
+        """
+        Метод записывает строки, полученные после begin_save
+        и еще не записанные приемником: изменившиеся пары (дата, логин) -
+        в хранилище, водяные знаки и журнал. Затем выгружает в CSV
+        и агрегаты все даты, накопленные в журнале, в том числе
+        оставшиеся от прерванного запуска. Ошибки логируются.
+        """
+        store = self._store
+        try:
+            if df_new.empty and not self._collector.rows:
+                logging.warning('Нет новых строк для сохранения')
+            self._write_logins(df_new)
+            dates = self.journal.get_dates()
+            with self.metrics.timer('write'):
+                store.export_csv(
+                    self._get_file_path(self._filename_data), dates
+                )
+            with self.metrics.timer('rollup'):
+                self._update_rollups(store, self._filename_data, dates)
+            self.journal.clear_dates()
+            if self._full_refresh:
+                self._watermarks.mark_full_refresh()
+                self._watermarks.save()
+            done = (
+                self.journal.get_logins('written')
+                + self.journal.get_logins('skipped')
             )
+            if len(done) == len(self.logins):
+                self.journal.finish()
+            else:
+                logging.warning(
+                    'Не все логины записаны, '
+                    'для продолжения запустите с --resume'
+                )
             logging.info('Данные успешно обновлены')
         except Exception as e:
             logging.error(f'Ошибка во время обновления: {e}')
+
+    def save_data(
+        self,
+        filename_temp: str,
+        filename_data: str,
+        resume: bool = False
+    ) -> None:
+        """
+        Метод сохраняет новые данные, объединяя с существующими.
+        Заменяются только пары (дата, логин), строки которых
+        изменились по сравнению с хранилищем; их список дописывается
+        в CHANGES_FILE. Если изменения есть, CSV переписывается
+        с месяца первой измененной даты (начало файла копируется).
+        В инкрементальном режиме выгружаются только даты после
+        водяного знака логина и последние volatile_days дней,
+        а логины без строк в нескольких выгрузках подряд опрашиваются
+        раз в DORMANT_POLL_INTERVAL_DAYS дней (кроме полной выгрузки).
+        Ход запуска пишется в журнал; при resume=True незавершенный
+        запуск продолжается только по логинам, которые еще не записаны.
+        Агрегаты по дням и месяцам обновляются за измененные даты
+        и выгружаются в <имя>_daily.csv и <имя>_monthly.csv.
+        Метрики этапов сохраняются в METRICS_FILE и METRICS_PROM_FILE.
+        Если задан shard, все файлы запуска получают суффикс шарда,
+        а итоговые данные собирает merge_shards.
+        """
+        try:
+            date_ranges = self.begin_save(filename_data, resume)
+            df_new = self._get_all_direct_data(
+                get_shard_filename(filename_temp, self.shard), date_ranges
+            )
+            self.end_save(df_new)
+        finally:
+            self.save_metrics()
+
+    def _save_changes(
+        self,
+        store: PartitionedStore,
+        changed: list[tuple[str, str]]
+    ) -> None:
+        """
+        Защищенный метод. Дописывает измененные пары (дата, логин)
+        запуска в CHANGES_FILE хранилища: одна строка JSON на запуск
+        со словарем {дата: [логины]}.
+        """
+        self.metrics.incr('changed_slices', len(changed))
+        if not changed:
+            return
+        slices: dict[str, list[str]] = {}
+        for date, login in changed:
+            slices.setdefault(date, []).append(login)
+        record = {'run_id': self.metrics.run_id, 'slices': slices}
+        with open(store.root / CHANGES_FILE, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def save_metrics(self) -> None:
+        """
+        Метод логирует метрики запуска, дописывает их в историю
+        JSON lines и обновляет файл метрик Prometheus.
+        """
+        self.metrics.log_stats()
+        try:
+            self.metrics.write_jsonl(self._get_file_path(
+                get_shard_filename(METRICS_FILE, self.shard)
+            ))
+            self.metrics.write_prometheus(self._get_file_path(
+                get_shard_filename(METRICS_PROM_FILE, self.shard)
+            ))
+        except OSError as e:
+            logging.error(f'Метрики запуска не сохранены: {e}')
+
+    def merge_shards(self, filename_data: str, shard_count: int) -> None:
+        """
+        Метод собирает итоговые данные из выгрузок шардов
+        1..shard_count: строки хранилищ шардов сводятся в хранилище
+        filename_data по парам (дата, логин), затем выгружаются CSV
+        и агрегаты. Строки логинов, которых за дату нет ни в одном
+        шарде, сохраняются. Переписываются только даты, изменившиеся
+        в шардах.
+        Хранилища шардов с других машин нужно заранее скопировать
+        в папку истории (data/history/<имя>.shard-i-of-N).
+        """
+        history = self._get_file_path(HISTORY_FOLDER)
+        shard_roots = [
+            history / Path(
+                get_shard_filename(filename_data, (index, shard_count))
+            ).stem
+            for index in range(1, shard_count + 1)
+        ]
+        missing = [root.name for root in shard_roots if not root.is_dir()]
+        if missing:
+            logging.error(f'Нет выгрузок шардов: {", ".join(missing)}')
+            return
+        with self.metrics.timer('load'):
+            store = self._get_store(filename_data)
+        try:
+            with self.metrics.timer('merge'):
+                dates = store.merge_from(
+                    [PartitionedStore(root) for root in shard_roots]
+                )
+            if not dates:
+                logging.info('Выгрузки шардов не изменились')
+            with self.metrics.timer('write'):
+                store.export_csv(self._get_file_path(filename_data), dates)
+            with self.metrics.timer('rollup'):
+                self._update_rollups(store, filename_data, dates)
+            logging.info('Данные шардов успешно собраны')
+        except Exception as e:
+            logging.error(f'Ошибка во время сборки шардов: {e}')
+        finally:
+            self.save_metrics()
@@ -0,0 +1,72 @@
+import logging
+
+import pandas as pd
+import pytest
+
+# Логи тестов не пишутся в папку logs репозитория: setup_logging
+# не трогает уже настроенное логирование.
+logging.basicConfig(level=logging.INFO, handlers=[logging.NullHandler()])
+
+from benchmarks.mock_direct_api import MockConfig, MockDirectAPI
+from parser.rate_limiter import AdaptiveRateLimiter
+from parser.schema import to_compact
+from parser.utils import get_date_list
+from parser.ya_direct import DirectSaveClient
+
+LOGINS = ['alpha-login', 'beta-login', 'gamma-login', 'delta-login']
+"""Логины тестовых выгрузок."""
+
+DAYS = 6
+"""Окно тестовых выгрузок в днях."""
+
+
+@pytest.fixture(scope='session')
+def mock_api():
+    """Имитация API отчетов, отвечающая без пауз retryIn."""
+    api = MockDirectAPI(MockConfig(
+        campaigns=4, polls_before_ready=1, retry_in=0
+    ))
+    api.start()
+    yield api
+    api.stop()
+
+
+@pytest.fixture
+def make_client(tmp_path, mock_api):
+    """Фабрика клиентов, работающих с имитацией API в tmp_path."""
+    def make(logins=LOGINS, folder=tmp_path, **kwargs):
+        return DirectSaveClient(
+            'test',
+            get_date_list(DAYS),
+            list(logins),
+            folder_name=str(folder),
+            api_url=mock_api.url,
+            rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000),
+            use_report_cache=False,
+            **kwargs
+        )
+    return make
+
+
+@pytest.fixture
+def make_rows():
+    """Фабрика строк отчета в компактной схеме хранилища."""
+    def make(dates, logins, clicks=1):
+        return to_compact(pd.DataFrame([
+            {
+                'Date': date,
+                'CampaignName': f'{login}_search',
+                'CampaignId': 100000,
+                'Device': 'DESKTOP',
+                'Impressions': 10 * clicks,
+                'Clicks': clicks,
+                'Cost': clicks * 1000000,
+                'акаунт': login,
+                'источник': 'yandex',
+                'поиск/сеть': 'search',
+                'тип': 'other'
+            }
+            for date in dates
+            for login in logins
+        ]))
+    return make
@@ -0,0 +1,111 @@
+from itertools import product
+
+import pandas as pd
+
+from parser.classifier import CampaignClassifier, TagMatcher
+from parser.constants import (
+    CAMPAIGN_CATEGORIES,
+    DEFAULT_RETURNES,
+    PLATFORM_TYPES
+)
+
+OVERLAPPING_TAGS = {'ab': 'ab', 'a': 'a', 'bc': 'bc', 'abc': 'abc', 'c': 'c'}
+"""Теги-префиксы и пересекающиеся теги для сравнения с перебором."""
+
+
+def first_match(tags, name, default):
+    """Перебор тегов по порядку, как в исходном классификаторе."""
+    for tag, value in tags.items():
+        if tag in name:
+            return value
+    return default
+
+
+def test_tag_matcher_matches_first_match_loop():
+    names = [
+        ''.join(chars)
+        for length in range(6)
+        for chars in product('abcx', repeat=length)
+    ]
+    for tags in (OVERLAPPING_TAGS, dict(reversed(OVERLAPPING_TAGS.items()))):
+        matcher = TagMatcher(tags, 'default')
+        for name in names:
+            assert matcher.match(name) == first_match(tags, name, 'default')
+
+
+def test_classify_matches_first_match_loop():
+    tags = [*PLATFORM_TYPES, *CAMPAIGN_CATEGORIES]
+    names = ['', 'no tags here'] + [
+        f'{first}_{second}' for first, second in product(tags, repeat=2)
+    ] + [f'{tag}{tag[::-1]}' for tag in tags]
+    classifier = CampaignClassifier()
+
+    for name in names:
+        assert classifier.classify(name) == [
+            first_match(
+                PLATFORM_TYPES, name, DEFAULT_RETURNES.get('platform', '')
+            ),
+            first_match(
+                CAMPAIGN_CATEGORIES, name, DEFAULT_RETURNES.get('campaign', '')
+            )
+        ]
+
+
+def test_classify_frame_matches_classify():
+    names = [
+        f'{platform}_{tag}_{index}'
+        for index, (platform, tag) in enumerate(
+            (platform, tag)
+            for platform in [*PLATFORM_TYPES, 'rsya']
+            for tag in [*CAMPAIGN_CATEGORIES, 'other']
+        )
+    ]
+    df = pd.DataFrame({'CampaignName': names * 3 + [None]})
+    classifier = CampaignClassifier()
+
+    for frame in (df, df.astype('category')):
+        platform, category = classifier.classify_frame(frame)
+        expected = [classifier.classify(name) for name in df['CampaignName']]
+        assert platform.tolist() == [value[0] for value in expected]
+        assert category.tolist() == [value[1] for value in expected]
+
+
+def test_classification_cache_survives_restart(tmp_path):
+    path = tmp_path / 'classes.json'
+    classifier = CampaignClassifier(path)
+    result = classifier.classify('brand_search_campaign')
+    classifier.save_cache()
+
+    restored = CampaignClassifier(path)
+
+    assert restored._cache == {'brand_search_campaign': result}
+
+
+def test_one_to_one_categorical_names_are_classified():
+    classifier = CampaignClassifier()
+    single = ['brand_search'] * 3
+    pair = ['brand_search', 'rsya_other']
+
+    for names in (single, pair, single + [None]):
+        frame = pd.DataFrame({'CampaignName': pd.Categorical(names)})
+        platform, category = classifier.classify_frame(frame)
+        expected = [
+            classifier.classify(name) for name in frame['CampaignName']
+        ]
+        assert platform.tolist() == [value[0] for value in expected]
+        assert category.tolist() == [value[1] for value in expected]
+
+
+def test_single_campaign_login_is_written(make_client, mock_api):
+    campaigns = mock_api.config.campaigns
+    mock_api.config.campaigns = 1
+    try:
+        client = make_client()
+        client.save_data('temp_test.csv', 'test.csv')
+    finally:
+        mock_api.config.campaigns = campaigns
+
+    assert client.journal.get_logins('written') == client.logins
+    assert client.read_data('test.csv')['CampaignName'].nunique() == len(
+        client.logins
+    )
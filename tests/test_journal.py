@@ -0,0 +1,49 @@
+import pandas as pd
+
+from parser.constants import ACCOUNT_COLUMN, JOURNAL_FILE
+from parser.journal import RunJournal
+from tests.conftest import LOGINS
+
+
+def test_resume_returns_logins_not_written(tmp_path):
+    journal = RunJournal(tmp_path / JOURNAL_FILE)
+    journal.start(LOGINS)
+    journal.set_states(LOGINS[:2], 'written')
+    journal.set_states(LOGINS[2:3], 'failed')
+
+    resumed = RunJournal(tmp_path / JOURNAL_FILE)
+
+    assert resumed.start(LOGINS, resume=True) == LOGINS[2:]
+    assert resumed.get_logins('written') == LOGINS[:2]
+
+
+def test_finished_run_is_not_resumed(tmp_path):
+    journal = RunJournal(tmp_path / JOURNAL_FILE)
+    journal.start(LOGINS)
+    journal.finish()
+
+    assert RunJournal(tmp_path / JOURNAL_FILE).start(
+        LOGINS, resume=True
+    ) == LOGINS
+
+
+def test_resume_fetches_only_failed_logins(make_client, tmp_path):
+    client = make_client()
+    request_report = client.request_report
+
+    def fail_beta(task):
+        if task.login == 'beta-login':
+            return 'failed', 0, None
+        return request_report(task)
+
+    client.request_report = fail_beta
+    client.save_data('temp_test.csv', 'test.csv')
+    assert client.journal.get_logins('failed') == ['beta-login']
+
+    resumed = make_client()
+    resumed.save_data('temp_test.csv', 'test.csv', resume=True)
+
+    assert resumed.fetched_logins == ['beta-login']
+    assert resumed.journal.get_logins('written') == LOGINS
+    df = pd.read_csv(tmp_path / 'test.csv', sep=';', encoding='cp1251')
+    assert sorted(df[ACCOUNT_COLUMN].unique()) == sorted(LOGINS)
@@ -0,0 +1,101 @@
+import argparse
+
+import pandas as pd
+import pytest
+
+from parser.constants import ACCOUNT_COLUMN
+from parser.main import positive_int_arg
+from parser.utils import get_shard_logins
+from tests.conftest import LOGINS
+
+SHARDS = 2
+
+
+def test_merged_shards_match_unsharded_run(make_client, tmp_path):
+    make_client(folder=tmp_path / 'single').save_data(
+        'temp_test.csv', 'test.csv'
+    )
+    for index in range(1, SHARDS + 1):
+        logins = get_shard_logins(LOGINS, index, SHARDS)
+        assert logins
+        make_client(
+            logins, folder=tmp_path / 'sharded', shard=(index, SHARDS)
+        ).save_data('temp_test.csv', 'test.csv')
+
+    make_client(folder=tmp_path / 'sharded').merge_shards(
+        'test.csv', SHARDS
+    )
+
+    assert (tmp_path / 'sharded' / 'test.csv').read_bytes() == (
+        tmp_path / 'single' / 'test.csv'
+    ).read_bytes()
+    for level in ('daily', 'monthly'):
+        name = f'test_{level}.csv'
+        assert (tmp_path / 'sharded' / name).read_bytes() == (
+            tmp_path / 'single' / name
+        ).read_bytes()
+
+
+def read_accounts(path):
+    df = pd.read_csv(path, sep=';', encoding='cp1251')
+    return sorted(df[ACCOUNT_COLUMN].unique())
+
+
+def run_shards(make_client, folder, fail_login=None):
+    for index in range(1, SHARDS + 1):
+        client = make_client(
+            get_shard_logins(LOGINS, index, SHARDS),
+            folder=folder,
+            shard=(index, SHARDS)
+        )
+        request_report = client.request_report
+
+        def fail(task, request_report=request_report):
+            if task.login == fail_login:
+                return 'failed', 0, None
+            return request_report(task)
+
+        client.request_report = fail
+        client.save_data('temp_test.csv', 'test.csv')
+
+
+def test_merge_keeps_logins_missing_from_shards(make_client, tmp_path):
+    make_client(folder=tmp_path).save_data('temp_test.csv', 'test.csv')
+    before = (tmp_path / 'test.csv').read_bytes()
+
+    run_shards(make_client, tmp_path, fail_login='beta-login')
+    make_client(folder=tmp_path).merge_shards('test.csv', SHARDS)
+
+    assert (tmp_path / 'test.csv').read_bytes() == before
+
+
+def test_merge_drops_logins_removed_in_shards(
+    make_client, mock_api, tmp_path
+):
+    run_shards(make_client, tmp_path)
+    make_client(folder=tmp_path).merge_shards('test.csv', SHARDS)
+    assert read_accounts(tmp_path / 'test.csv') == sorted(LOGINS)
+
+    index = next(
+        index for index in range(1, SHARDS + 1)
+        if 'beta-login' in get_shard_logins(LOGINS, index, SHARDS)
+    )
+    campaigns = mock_api.config.campaigns
+    mock_api.config.campaigns = 0
+    try:
+        make_client(
+            ['beta-login'], folder=tmp_path, shard=(index, SHARDS)
+        ).save_data('temp_test.csv', 'test.csv')
+    finally:
+        mock_api.config.campaigns = campaigns
+    make_client(folder=tmp_path).merge_shards('test.csv', SHARDS)
+
+    assert read_accounts(tmp_path / 'test.csv') == sorted(
+        login for login in LOGINS if login != 'beta-login'
+    )
+
+
+@pytest.mark.parametrize('value', ['0', '-1', 'two'])
+def test_merge_rejects_invalid_shard_count(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        positive_int_arg(value)
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+import requests
+
+from parser import rate_limiter
+from parser.constants import (
+    QUEUE_LIMIT_ERROR_CODE,
+    RATE_LIMIT_MIN_RATE,
+    RATE_LIMIT_PAUSE
+)
+from parser.rate_limiter import AdaptiveRateLimiter
+
+
+class FakeClock:
+    """Часы, время которых идет только во время sleep()."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        self.slept += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter, 'time', clock)
+    return clock
+
+
+def make_response(status_code=200, error_code=None):
+    response = requests.Response()
+    response.status_code = status_code
+    if error_code is not None:
+        response._content = json.dumps(
+            {'error': {'error_code': error_code}}
+        ).encode('utf-8')
+    return response
+
+
+def test_bucket_refills_at_configured_rate(clock):
+    limiter = AdaptiveRateLimiter(rate=2, burst=2)
+    limiter.acquire()
+    limiter.acquire()
+    assert clock.slept == 0
+
+    for _ in range(10):
+        limiter.acquire()
+
+    assert clock.slept == pytest.approx(5.0)
+
+
+def test_queue_limit_halves_concurrency_to_floor(clock):
+    limiter = AdaptiveRateLimiter(rate=10, burst=10, max_concurrency=8)
+    response = make_response(400, QUEUE_LIMIT_ERROR_CODE)
+    assert limiter.is_throttled(response)
+
+    concurrency = []
+    for _ in range(5):
+        limiter.on_response(response)
+        concurrency.append(limiter.concurrency)
+
+    assert concurrency == [4, 2, 1, 1, 1]
+    assert limiter.rate == 10
+    limiter.acquire()
+    assert clock.slept == pytest.approx(RATE_LIMIT_PAUSE)
+
+
+def test_too_many_requests_halves_rate_to_floor(clock):
+    limiter = AdaptiveRateLimiter(rate=1, burst=1)
+    response = make_response(429)
+    assert limiter.is_throttled(response)
+
+    for _ in range(10):
+        limiter.on_response(response)
+
+    assert limiter.rate == RATE_LIMIT_MIN_RATE
+
+
+def test_successes_restore_concurrency_and_rate(clock):
+    limiter = AdaptiveRateLimiter(rate=10, burst=10, max_concurrency=4)
+    for _ in range(3):
+        limiter.on_response(make_response(400, QUEUE_LIMIT_ERROR_CODE))
+        limiter.on_response(make_response(400, 56))
+    assert (limiter.concurrency, limiter.rate) == (1, 1.25)
+
+    for _ in range(1 + 2 + 3):
+        limiter.on_response(make_response())
+    assert limiter.concurrency == 4
+
+    for _ in range(20):
+        limiter.on_response(make_response())
+    assert (limiter.concurrency, limiter.rate) == (4, 10)
@@ -0,0 +1,30 @@
+import os
+
+from parser.report_cache import ReportCache
+
+
+def test_put_does_not_scan_cache_below_limit(tmp_path, monkeypatch):
+    cache = ReportCache(tmp_path, max_bytes=10 ** 9)
+    scans = []
+    scan = cache._scan
+    monkeypatch.setattr(cache, '_scan', lambda: scans.append(1) or scan())
+    for number in range(20):
+        cache.put(cache.make_key('login', str(number)), b'x' * 100)
+    assert len(scans) == 1
+
+
+def test_put_evicts_least_recently_used(tmp_path):
+    cache = ReportCache(tmp_path, max_bytes=10 ** 9)
+    keys = [cache.make_key('login', str(number)) for number in range(10)]
+    for number, key in enumerate(keys):
+        cache.put(key, bytes(range(256)) * 40)
+        path = cache._get_path(key)
+        os.utime(path, (number, path.stat().st_mtime))
+    entry_size = cache._size // len(keys)
+
+    cache.max_bytes = entry_size * 5
+    cache.put(cache.make_key('login', 'new'), bytes(range(256)) * 40)
+    sizes = [entry[1] for entry in cache._scan()]
+    assert sum(sizes) == cache._size <= cache.max_bytes
+    assert cache.get(keys[-1], '2000-01-01') is not None
+    assert cache.get(keys[0], '2000-01-01') is None
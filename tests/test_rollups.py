@@ -0,0 +1,62 @@
+import pandas as pd
+
+from parser.constants import COST_COLUMN, ROLLUP_LEVELS
+from parser.rollups import RollupStore
+from parser.storage import PartitionedStore
+
+DATES = ['2024-01-30', '2024-01-31', '2024-02-01', '2024-03-01']
+LOGINS = ['alpha-login', 'beta-login']
+
+
+def read_level(rollups, level):
+    return {
+        month: pd.read_parquet(rollups._month_path(level, month))
+        for month in rollups.months(level)
+    }
+
+
+def month_mtimes(rollups):
+    return {
+        (level, month): rollups._month_path(level, month).stat().st_mtime_ns
+        for level in ROLLUP_LEVELS
+        for month in rollups.months(level)
+    }
+
+
+def test_update_rewrites_only_affected_months(tmp_path, make_rows):
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(DATES, LOGINS))
+    rollups = RollupStore(tmp_path / 'rollups')
+    rollups.update(store, DATES)
+    before = month_mtimes(rollups)
+
+    store.upsert(
+        make_rows(['2024-02-01'], LOGINS[:1], clicks=5),
+        {LOGINS[0]: ['2024-02-01']}
+    )
+    assert rollups.update(store, ['2024-02-01']) == 1
+
+    after = month_mtimes(rollups)
+    assert {key for key in after if after[key] != before[key]} == {
+        ('daily', '2024-02'), ('monthly', '2024-02')
+    }
+    full = RollupStore(tmp_path / 'full')
+    full.update(store, store.dates())
+    for level in ROLLUP_LEVELS:
+        expected = read_level(full, level)
+        actual = read_level(rollups, level)
+        assert list(actual) == list(expected)
+        for month, df in expected.items():
+            pd.testing.assert_frame_equal(actual[month], df)
+
+
+def test_update_counts_missing_cost_as_zero(tmp_path, make_rows):
+    rows = make_rows(DATES[:1], LOGINS)
+    rows[COST_COLUMN] = [1000000, None]
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(rows)
+    rollups = RollupStore(tmp_path / 'rollups')
+    rollups.update(store, DATES[:1])
+
+    daily = read_level(rollups, 'daily')['2024-01']
+    assert daily[COST_COLUMN].tolist() == [1000000, 0]
@@ -0,0 +1,59 @@
+import sys
+
+from parser.constants import MAX_WORKERS
+from parser.jobs import PortfolioJob
+from parser.main import parse_args
+from parser.rate_limiter import AdaptiveRateLimiter
+from parser.runner import PortfolioRunner
+from parser.utils import get_date_list
+
+from tests.conftest import DAYS, LOGINS
+
+JOB = PortfolioJob('test', tuple(LOGINS), 'test.csv', days=DAYS)
+"""Портфель тестовых выгрузок."""
+
+
+def make_runner(folder, url, **kwargs) -> PortfolioRunner:
+    """Функция создает запуск портфеля JOB на имитации API."""
+    return PortfolioRunner(
+        'test',
+        [JOB],
+        folder_name=str(folder),
+        rate_limiter=AdaptiveRateLimiter(rate=1000, burst=1000),
+        use_report_cache=False,
+        api_url=url,
+        **kwargs
+    )
+
+
+def test_force_full_reaches_clients(tmp_path, mock_api):
+    make_runner(tmp_path, mock_api.url).run()
+
+    incremental = make_runner(tmp_path, mock_api.url).clients[0]
+    date_ranges = incremental.begin_save(JOB.filename)
+    assert all(len(dates) < DAYS for dates in date_ranges.values())
+
+    full = make_runner(tmp_path, mock_api.url, force_full=True).clients[0]
+    date_ranges = full.begin_save(JOB.filename)
+    assert date_ranges == {login: get_date_list(DAYS) for login in LOGINS}
+
+
+def test_debug_dump_reaches_clients(tmp_path, mock_api):
+    make_runner(tmp_path, mock_api.url).run()
+    assert not (tmp_path / JOB.filename_temp).exists()
+
+    make_runner(tmp_path, mock_api.url, debug_dump=True).run()
+    assert (tmp_path / JOB.filename_temp).stat().st_size > 0
+
+
+def test_workers_option_reaches_clients(tmp_path, mock_api, monkeypatch):
+    monkeypatch.setattr(sys, 'argv', ['main'])
+    assert parse_args().workers == MAX_WORKERS > 1
+    monkeypatch.setattr(sys, 'argv', ['main', '--workers', '3'])
+    workers = parse_args().workers
+
+    runner = make_runner(tmp_path, mock_api.url, max_workers=workers)
+
+    assert [client.max_workers for client in runner.clients] == [3]
+    runner.run()
+    assert (tmp_path / JOB.filename).exists()
@@ -0,0 +1,90 @@
+import threading
+
+from parser.scheduler import ReportScheduler, ReportTask
+
+
+def make_tasks(count, date_from='2024-01-01', date_to='2024-01-04'):
+    return [
+        ReportTask(f'login-{index}', date_from, date_to)
+        for index in range(count)
+    ]
+
+
+def test_reports_are_polled_until_ready():
+    polls = {}
+    lock = threading.Lock()
+
+    def request(task):
+        with lock:
+            polls[task.login] = polls.get(task.login, 0) + 1
+            if polls[task.login] < 3:
+                return 'building', 0, None
+        return 'ready', 0, task.login.encode()
+
+    finished = []
+    tasks = ReportScheduler(request, max_workers=2).run(
+        make_tasks(4), finished.append
+    )
+
+    assert [task.status for task in tasks] == ['done'] * 4
+    assert [task.result for task in tasks] == [
+        f'login-{index}'.encode() for index in range(4)
+    ]
+    assert sorted(task.login for task in finished) == sorted(polls)
+    assert set(polls.values()) == {3}
+
+
+def test_reports_in_queue_are_capped():
+    building = set()
+    peak = 0
+    lock = threading.Lock()
+
+    def request(task):
+        nonlocal peak
+        with lock:
+            if task.polls < 2:
+                building.add(task.login)
+                peak = max(peak, len(building))
+                return 'building', 0, None
+            building.discard(task.login)
+        return 'ready', 0, b''
+
+    tasks = ReportScheduler(request, max_in_flight=3, max_workers=4).run(
+        make_tasks(10)
+    )
+
+    assert all(task.status == 'done' for task in tasks)
+    assert peak == 3
+
+
+def test_too_large_report_is_split_into_covering_periods():
+    def request(task):
+        if task.days > 1:
+            return 'too_large', 0, None
+        return 'ready', 0, task.date_from.encode()
+
+    (task,) = ReportScheduler(request).run(
+        make_tasks(1, '2024-01-01', '2024-01-05')
+    )
+
+    leaves = task.leaves()
+    assert task.status == 'split'
+    assert [leaf.date_from for leaf in leaves] == [
+        f'2024-01-0{day}' for day in range(1, 6)
+    ]
+    assert all(leaf.status == 'done' for leaf in leaves)
+
+
+def test_failed_reports_are_retried_once():
+    attempts = {}
+
+    def request(task):
+        attempts[task.login] = attempts.get(task.login, 0) + 1
+        if task.login == 'login-1' and attempts[task.login] == 1:
+            return 'failed', 0, None
+        return 'ready', 0, b''
+
+    tasks = ReportScheduler(request).run_with_retries(make_tasks(3))
+
+    assert all(task.status == 'done' for task in tasks)
+    assert attempts == {'login-0': 1, 'login-1': 2, 'login-2': 1}
@@ -0,0 +1,234 @@
+import pandas as pd
+import pytest
+
+from parser.constants import (
+    ACCOUNT_COLUMN,
+    COST_COLUMN,
+    DATE_COLUMN,
+    REPORT_DTYPES,
+    STORE_BATCH_DATES
+)
+from parser.schema import from_output, to_output
+from parser.storage import PartitionedStore
+
+DATES = ['2024-01-01', '2024-01-02', '2024-01-03']
+LOGINS = ['alpha-login', 'beta-login']
+
+
+def read_all(store):
+    return store.read_dates(store.dates())
+
+
+def test_upsert_replaces_only_refreshed_pairs(tmp_path, make_rows):
+    store = PartitionedStore(tmp_path)
+    store.append(make_rows(DATES, LOGINS, clicks=1))
+
+    changed = store.upsert(
+        make_rows(DATES[1:], ['alpha-login'], clicks=5),
+        {'alpha-login': DATES[1:]}
+    )
+
+    assert changed == [
+        ('2024-01-02', 'alpha-login'), ('2024-01-03', 'alpha-login')
+    ]
+    df = read_all(store)
+    clicks = df.set_index([DATE_COLUMN, ACCOUNT_COLUMN])['Clicks']
+    assert clicks[('2024-01-01', 'alpha-login')] == 1
+    assert clicks[('2024-01-02', 'alpha-login')] == 5
+    assert clicks[('2024-01-02', 'beta-login')] == 1
+    assert len(df) == len(DATES) * len(LOGINS)
+
+
+def test_upsert_skips_unchanged_pairs(tmp_path, make_rows):
+    store = PartitionedStore(tmp_path)
+    store.append(make_rows(DATES, LOGINS))
+    mtimes = {
+        path.name: path.stat().st_mtime_ns
+        for path in tmp_path.glob('*.parquet')
+    }
+
+    changed = store.upsert(
+        make_rows(DATES, LOGINS),
+        {login: DATES for login in LOGINS}
+    )
+
+    assert changed == []
+    assert mtimes == {
+        path.name: path.stat().st_mtime_ns
+        for path in tmp_path.glob('*.parquet')
+    }
+
+
+def test_upsert_removes_refreshed_pairs_without_rows(tmp_path, make_rows):
+    store = PartitionedStore(tmp_path)
+    store.append(make_rows(DATES, LOGINS))
+
+    changed = store.upsert(
+        make_rows(DATES[:1], ['beta-login']),
+        {'beta-login': DATES}
+    )
+
+    assert changed == [
+        ('2024-01-02', 'beta-login'), ('2024-01-03', 'beta-login')
+    ]
+    df = read_all(store)
+    assert sorted(
+        df.loc[df[ACCOUNT_COLUMN] == 'beta-login', DATE_COLUMN].astype(str)
+    ) == DATES[:1]
+
+
+def test_per_login_layout_is_migrated(tmp_path, make_rows):
+    rows = make_rows(DATES, LOGINS)
+    for (date, login), part in rows.groupby(
+        [DATE_COLUMN, ACCOUNT_COLUMN], observed=True
+    ):
+        date_dir = tmp_path / f'date={date}'
+        date_dir.mkdir(exist_ok=True)
+        to_output(part).to_parquet(
+            date_dir / f'{login}.parquet', index=False
+        )
+
+    store = PartitionedStore(tmp_path)
+
+    assert store.dates() == DATES
+    assert not [path for path in tmp_path.iterdir() if path.is_dir()]
+    pd.testing.assert_frame_equal(
+        read_all(store).astype(str), rows.astype(str)
+    )
+    assert store.upsert(
+        make_rows(DATES, LOGINS), {login: DATES for login in LOGINS}
+    ) == []
+
+
+def test_cost_with_gaps_is_not_converted_twice(tmp_path, make_rows):
+    legacy = to_output(make_rows(DATES[:1], LOGINS))
+    legacy[COST_COLUMN] = [1.2, None]
+    csv_path = tmp_path / 'legacy.csv'
+    legacy.to_csv(csv_path, index=False, sep=';', encoding='cp1251')
+
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(from_output(pd.read_csv(
+        csv_path, sep=';', encoding='cp1251', dtype=REPORT_DTYPES
+    )))
+    store.export_csv(tmp_path / 'test.csv')
+
+    exported = pd.read_csv(tmp_path / 'test.csv', sep=';', encoding='cp1251')
+    assert exported[COST_COLUMN].iloc[0] == 1.2
+    assert exported[COST_COLUMN].isna().tolist() == [False, True]
+
+
+def test_export_aligns_partitions_of_different_profiles(tmp_path, make_rows):
+    dates = [
+        date.strftime('%Y-%m-%d') for date in pd.date_range(
+            '2024-01-01', periods=STORE_BATCH_DATES + 2
+        )
+    ]
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(dates[:STORE_BATCH_DATES], LOGINS, clicks=2))
+    store.append(
+        make_rows(dates[STORE_BATCH_DATES:], LOGINS, clicks=3).drop(
+            columns=['CampaignId', 'Device']
+        )
+    )
+
+    store.export_csv(tmp_path / 'test.csv')
+
+    df = pd.read_csv(tmp_path / 'test.csv', sep=';', encoding='cp1251')
+    default = df.iloc[:STORE_BATCH_DATES * len(LOGINS)]
+    campaigns = df.iloc[STORE_BATCH_DATES * len(LOGINS):]
+    assert list(df.columns) == list(make_rows(dates, LOGINS).columns)
+    assert len(campaigns) == 2 * len(LOGINS)
+    assert set(default['Clicks']) == {2.0}
+    assert set(campaigns['Clicks']) == {3.0}
+    assert set(campaigns['Cost']) == {3.6}
+    assert campaigns['Device'].isna().all()
+
+
+def test_export_rewrites_only_months_from_first_changed_date(
+    tmp_path, make_rows
+):
+    dates = [
+        date.strftime('%Y-%m-%d')
+        for date in pd.date_range('2024-01-01', '2024-03-31')
+    ]
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(dates, LOGINS))
+    store.export_csv(tmp_path / 'test.csv')
+    read_dates = []
+    read_partitions = store._read_partitions
+
+    def record(dates):
+        read_dates.extend(dates)
+        return read_partitions(dates)
+
+    store._read_partitions = record
+    for changed_dates in (['2024-02-20', '2024-03-31'], ['2024-01-05']):
+        read_dates.clear()
+        changed = store.upsert(
+            make_rows(changed_dates, LOGINS[:1], clicks=7),
+            {LOGINS[0]: changed_dates}
+        )
+        store.export_csv(
+            tmp_path / 'test.csv', sorted({date for date, _ in changed})
+        )
+        assert min(read_dates) == min(changed_dates)[:7] + '-01'
+
+        store.export_csv(tmp_path / 'full.csv')
+        assert (tmp_path / 'test.csv').read_bytes() == (
+            tmp_path / 'full.csv'
+        ).read_bytes()
+        store.export_csv(tmp_path / 'test.csv')
+
+
+def test_export_is_full_when_csv_changed_since_last_export(
+    tmp_path, make_rows
+):
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(DATES, LOGINS))
+    path = tmp_path / 'test.csv'
+    store.export_csv(path)
+    expected = path.read_bytes()
+    path.write_bytes(expected[:-10])
+
+    store.export_csv(path, DATES[-1:])
+
+    assert path.read_bytes() == expected
+
+
+def test_export_rejects_names_outside_cp1251(tmp_path, make_rows, caplog):
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(DATES, LOGINS))
+    path = tmp_path / 'test.csv'
+    store.export_csv(path)
+    before = path.read_bytes()
+
+    rows = make_rows(DATES[-1:], LOGINS[:1])
+    rows['CampaignName'] = pd.Categorical(['акция ✓'])
+    store.upsert(rows, {LOGINS[0]: DATES[-1:]})
+    with pytest.raises(UnicodeEncodeError):
+        store.export_csv(path, DATES[-1:])
+
+    assert path.read_bytes() == before
+    assert "'акция ✓'" in caplog.text
+    assert LOGINS[0] in caplog.text
+
+
+def test_export_after_failed_export_is_full(tmp_path, make_rows):
+    store = PartitionedStore(tmp_path / 'store')
+    store.append(make_rows(DATES, LOGINS))
+    path = tmp_path / 'test.csv'
+    store.export_csv(path)
+
+    rows = make_rows(DATES[-1:], LOGINS[:1])
+    rows['CampaignName'] = pd.Categorical(['акция ✓'])
+    store.upsert(rows, {LOGINS[0]: DATES[-1:]})
+    with pytest.raises(UnicodeEncodeError):
+        store.export_csv(path, DATES[-1:])
+    store.upsert(make_rows(DATES[-1:], LOGINS[:1], clicks=7), {
+        LOGINS[0]: DATES[-1:]
+    })
+    store.export_csv(path, [])
+
+    expected = tmp_path / 'expected.csv'
+    store.export_csv(expected)
+    assert path.read_bytes() == expected.read_bytes()
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from benchmarks.mock_direct_api import MockConfig, MockDirectAPI
+from parser.constants import REPORT_FIELDS
+from parser.transport import DirectTransport
+
+BODY = json.dumps({'params': {
+    'SelectionCriteria': {'DateFrom': '2024-01-01', 'DateTo': '2024-01-02'},
+    'FieldNames': list(REPORT_FIELDS)
+}})
+"""Тело запроса отчета за два дня."""
+
+HEADERS = {'Client-Login': 'alpha-login'}
+"""Заголовки запроса отчета."""
+
+
+@pytest.fixture
+def make_api():
+    """Фабрика отдельных имитаций API со своими счетчиками ответов."""
+    apis = []
+
+    def make(**kwargs):
+        api = MockDirectAPI(MockConfig(
+            polls_before_ready=0, retry_in=0, seed=1, **kwargs
+        ))
+        api.start()
+        apis.append(api)
+        return api
+    yield make
+    for api in apis:
+        api.stop()
+
+
+def test_server_errors_are_retried_on_shared_session(make_api):
+    api = make_api(error_rate_500=0.5)
+    transport = DirectTransport(retries=20, backoff_factor=0)
+
+    codes = [
+        transport.post(api.url, BODY, HEADERS).status_code
+        for _ in range(10)
+    ]
+
+    assert codes == [200] * 10
+    assert api.counters[500] > 0
+    assert api.counters[200] == 10
+    assert transport.requests_count == 10
+    assert transport.connections_count == 1
+
+
+def test_client_errors_are_not_retried(make_api):
+    api = make_api(error_rate_400=1.0)
+    transport = DirectTransport(retries=20, backoff_factor=0)
+
+    response = transport.post(api.url, BODY, HEADERS)
+
+    assert response.status_code == 400
+    assert api.counters == {400: 1}
@@ -0,0 +1,117 @@
+import pandas as pd
+
+from parser.constants import ACCOUNT_COLUMN, HISTORY_FOLDER, WATERMARKS_FILE
+from parser.schema import to_output
+from parser.storage import PartitionedStore
+from parser.watermarks import WatermarkStore
+from tests.conftest import LOGINS
+
+
+def read_csv(path):
+    return pd.read_csv(path, sep=';', encoding='cp1251')
+
+
+def test_run_without_rows_still_finishes(make_client, mock_api, tmp_path):
+    make_client().save_data('temp_test.csv', 'test.csv')
+    campaigns = mock_api.config.campaigns
+    mock_api.config.campaigns = 0
+    try:
+        client = make_client(LOGINS[:1])
+        client.save_data('temp_test.csv', 'test.csv')
+    finally:
+        mock_api.config.campaigns = campaigns
+
+    assert client.journal.get_logins('written') == LOGINS[:1]
+    watermarks = WatermarkStore(
+        tmp_path / HISTORY_FOLDER / 'test' / WATERMARKS_FILE
+    )
+    assert watermarks.get(LOGINS[0]) is not None
+    assert sorted(
+        read_csv(tmp_path / 'test.csv')[ACCOUNT_COLUMN].unique()
+    ) == sorted(LOGINS[1:])
+
+
+def test_final_pass_retries_logins_failed_in_processing(
+    make_client, tmp_path
+):
+    client = make_client()
+    parse_report = client._parse_report
+    failures = []
+
+    def fail_beta_once(data, login):
+        if login == 'beta-login' and not failures:
+            failures.append(login)
+            raise ValueError('поврежденный отчет')
+        return parse_report(data, login)
+
+    client._parse_report = fail_beta_once
+    client.save_data('temp_test.csv', 'test.csv')
+
+    assert failures == ['beta-login']
+    assert sorted(client.fetched_logins) == sorted(LOGINS)
+    assert client.journal.get_logins('written') == LOGINS
+    assert sorted(
+        read_csv(tmp_path / 'test.csv')[ACCOUNT_COLUMN].unique()
+    ) == sorted(LOGINS)
+
+
+def test_query_does_not_write_to_disk(make_client, make_rows, tmp_path):
+    rows = make_rows(['2024-01-01'], LOGINS)
+    to_output(rows).to_csv(
+        tmp_path / 'test.csv', index=False, sep=';', encoding='cp1251'
+    )
+    before = sorted(tmp_path.rglob('*'))
+
+    client = make_client()
+    assert client.read_data('test.csv').empty
+    assert sorted(tmp_path.rglob('*')) == before
+
+    client.save_data('temp_test.csv', 'test.csv')
+    assert set(client.read_data('test.csv')[ACCOUNT_COLUMN]) == set(LOGINS)
+
+
+def test_sink_writes_rows_in_bounded_batches(make_client, tmp_path):
+    make_client(folder=tmp_path / 'whole').save_data(
+        'temp_test.csv', 'test.csv'
+    )
+
+    client = make_client(folder=tmp_path / 'flushed', flush_bytes=1)
+    client.save_data('temp_test.csv', 'test.csv')
+
+    assert client.metrics.summary()['counters']['flushes'] == len(LOGINS)
+    assert client.journal.get_logins('written') == LOGINS
+    assert client.journal.get_dates() == []
+    watermarks = WatermarkStore(
+        tmp_path / 'flushed' / HISTORY_FOLDER / 'test' / WATERMARKS_FILE
+    )
+    assert all(watermarks.get(login) is not None for login in LOGINS)
+    assert (tmp_path / 'flushed' / 'test.csv').read_bytes() == (
+        tmp_path / 'whole' / 'test.csv'
+    ).read_bytes()
+
+
+def test_dates_written_before_failed_export_are_exported_next_run(
+    make_client, mock_api, tmp_path, monkeypatch
+):
+    make_client().save_data('temp_test.csv', 'test.csv')
+    campaigns = mock_api.config.campaigns
+    mock_api.config.campaigns = 2
+    try:
+        with monkeypatch.context() as patch:
+            def fail(store, path, dates=None):
+                raise OSError('диск заполнен')
+
+            patch.setattr(PartitionedStore, 'export_csv', fail)
+            client = make_client(flush_bytes=1)
+            client.save_data('temp_test.csv', 'test.csv')
+        assert client.journal.get_dates()
+
+        make_client().save_data('temp_test.csv', 'test.csv')
+    finally:
+        mock_api.config.campaigns = campaigns
+
+    store = PartitionedStore(tmp_path / HISTORY_FOLDER / 'test')
+    store.export_csv(tmp_path / 'full.csv')
+    assert (tmp_path / 'test.csv').read_bytes() == (
+        tmp_path / 'full.csv'
+    ).read_bytes()